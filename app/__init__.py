@@ -6,6 +6,16 @@ This package contains the core application logic for a multi-clinic chatbot syst
 that supports multiple clinics and users with persistent chat history.
 """
 
+import logging
+
+from app.config.settings import settings
+
+# Chat-path modules log through `logging`; debug detail is only formatted when LOG_LEVEL=DEBUG
+logging.basicConfig(
+    level=getattr(logging, settings.log_level.upper(), logging.INFO),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
 __version__ = "2.0.0"
 __author__ = "Wired-In Labs"
 __description__ = "AI-powered chatbot system supporting multiple clinics and users"
\ No newline at end of file
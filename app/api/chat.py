@@ -1,72 +1,72 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
-import json
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List
+import logging
+import orjson
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
 
 from app.models.chat_models import ChatRequest, ChatResponse
 from app.services.supabase_service import supabase_service
 from app.services.openai_service import openai_service
-from app.utils.prompt import get_system_prompt
+from app.services.cache_service import cache_service
+from app.services.rate_limiter import rate_limiter
+from app.utils.prompt import get_system_prompt, _today
 from app.utils.functions import available_slots, book_appointment
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["chat"])
 
+# Messages of context sent to OpenAI (and loaded from history) per turn
+MAX_CTX = 20
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """
     Main chat endpoint for multi-clinic chatbot
     """
-    user_input = request.message.strip()
-    clinic_id = request.clinic_id
-    phone_number = request.phone_number
-    user_name = request.user_name
-    
-    # Handle empty messages
-    if not user_input:
+    # Handle empty messages before doing any work
+    if not request.message or request.message.isspace():
         return ChatResponse(
-            response="I'm here to help you. Please let me know what you need assistance with.",
+            response=EMPTY_MESSAGE_REPLY,
             session_id="",
             user_id="",
             clinic_name=""
         )
     
+    user_input = request.message.strip()
+    clinic_id = request.clinic_id
+    phone_number = request.phone_number
+    
+    # Reject abusive traffic before it reaches Supabase or OpenAI
+    if not await rate_limiter.hit(phone_number, clinic_id):
+        raise HTTPException(status_code=429, detail="Too many requests, please try again later")
+    
+    # Messages produced during this turn, written to the database in one insert at the end
+    pending_messages = []
+    session_id = user_id = None
+
     try:
-        # 1. Get clinic data from Supabase
-        clinic_data = await supabase_service.get_clinic_data(clinic_id)
-        if not clinic_data:
-            raise HTTPException(status_code=404, detail=f"Clinic not found: {clinic_id}")
-        
-        # 2. Get or create user
-        user = await supabase_service.get_or_create_user(phone_number, clinic_id, user_name)
-        if not user:
-            raise HTTPException(status_code=500, detail="Failed to manage user")
-        
-        # 3. Get or create chat session
-        session = await supabase_service.get_chat_session(user['id'], clinic_id)
-        if not session:
-            raise HTTPException(status_code=500, detail="Failed to manage chat session")
-        
-        # 4. Load chat history
-        chat_history = await supabase_service.get_chat_history(session['id'])
-        
-        # 5. Add current user message to history and save it
-        chat_history.append({"role": "user", "content": user_input})
-        await supabase_service.save_message(
-            session['id'], user['id'], clinic_id, 
-            "user", user_input
-        )
+        # 1-5. Load clinic, user, session and history; queue the user message
+        clinic_data, user_id, session_id, chat_history = await _start_turn(request, user_input, pending_messages)
         
         # 6. Generate system prompt with clinic data
         system_prompt = get_system_prompt(clinic_data)
         
-        # 7. Get response from OpenAI
-        response = openai_service.call_openai(chat_history, system_prompt)
-        reply = response.choices[0].message
+        # 7. Serve from the response cache, otherwise get response from OpenAI
+        reply_content, cache_entry = await _lookup_cached_reply(clinic_id, session_id, system_prompt, chat_history, user_input)
+
+        if reply_content is not None:
+            logger.debug("Serving reply from response cache")
+            reply = None
+        else:
+            response = await openai_service.call_openai(chat_history[-MAX_CTX:], system_prompt)
+            reply = response.choices[0].message
 
         # 8. Handle tool calls
-        if reply.tool_calls:
-            # Add the assistant's tool call message to history and save it
+        if reply is not None and reply.tool_calls:
             tool_calls_data = [
                 {
                     "id": tool_call.id,
@@ -77,151 +77,391 @@ async def chat_endpoint(request: ChatRequest):
                     }
                 } for tool_call in reply.tool_calls
             ]
-            
-            chat_history.append({
-                "role": "assistant", 
-                "content": reply.content,
-                "tool_calls": tool_calls_data
-            })
-            
-            await supabase_service.save_message(
-                session['id'], user['id'], clinic_id,
-                "assistant", reply.content, tool_calls_data
+            await _run_tool_calls(
+                reply.content, tool_calls_data, chat_history, pending_messages,
+                clinic_data, clinic_id, user_id, phone_number
             )
-            
-            # Process each tool call
-            for tool_call in reply.tool_calls:
-                fn_name = tool_call.function.name
-                args = json.loads(tool_call.function.arguments)
-
-                # Handle date conversions for available_slots
-                if fn_name == "available_slots" and "date" in args:
-                    args = _process_date_argument(args)
-
-                # Execute the function
-                try:
-                    if fn_name == "available_slots":
-                        print(f"🔍 Getting slots for service: {args['service']} on {args['date']}")
-                        result = await available_slots(
-                            service=args["service"],
-                            date=args["date"],
-                            clinic_data=clinic_data
-                        )
-                        
-                    elif fn_name == "book_appointment":
-                        print(f"📅 Booking appointment for service: {args['service']}")
-                        result = await book_appointment(
-                            service=args["service"],
-                            patient_name=args["patient_name"],
-                            slot=args["slot"],
-                            patient_phone=args.get("patient_phone", phone_number),
-                            clinic_data=clinic_data
-                        )
-                        
-                        # If booking was successful, save appointment to database
-                        if isinstance(result, str) and "✅ Appointment Confirmed!" in result:
-                            appointment_details = {
-                                'patient_name': args["patient_name"],
-                                'patient_phone': args.get("patient_phone", phone_number),
-                                'service': args["service"],
-                                'appointment_time_utc': args["slot"],
-                                'duration_minutes': 30,  # Default, should be extracted from clinic data
-                                'doctor_email': None,  # Should be extracted from clinic data
-                                'event_id': None,
-                                'event_link': None
-                            }
-                            
-                            await supabase_service.save_appointment(
-                                user['id'], clinic_id, appointment_details
-                            )
-                        
-                    else:
-                        result = "Unknown function"
-                        
-                except Exception as e:
-                    print(f"❌ Error executing {fn_name}: {e}")
-                    result = f"Error executing function: {str(e)}"
-
-                # Add function result to chat history and save it
-                tool_result_content = json.dumps(result) if isinstance(result, (list, dict)) else str(result)
-                
-                chat_history.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "name": fn_name,
-                    "content": tool_result_content
-                })
-                
-                await supabase_service.save_message(
-                    session['id'], user['id'], clinic_id,
-                    "tool", tool_result_content, 
-                    tool_call_id=tool_call.id, function_name=fn_name
-                )
 
             # Get final response from OpenAI after function execution
-            response = openai_service.call_openai(chat_history, system_prompt)
-            reply = response.choices[0].message
+            response = await openai_service.call_openai(chat_history[-MAX_CTX:], system_prompt)
+            reply_content = response.choices[0].message.content
 
-        # 9. Add final assistant response to history and save it
-        chat_history.append({"role": "assistant", "content": reply.content})
-        await supabase_service.save_message(
-            session['id'], user['id'], clinic_id,
-            "assistant", reply.content
-        )
-        
-        # 10. Update session data as backup
-        await supabase_service.update_session_data(session['id'], chat_history)
+        elif reply is not None:
+            # Plain answer (no tool calls) - safe to reuse for identical/similar turns
+            reply_content = reply.content
+            await _store_cached_reply(cache_entry, reply_content)
+
+        # 9. Add final assistant response to history
+        chat_history.append({"role": "assistant", "content": reply_content})
+        pending_messages.append(_pending_message("assistant", reply_content))
+
+        # 10. Save the turn's messages (chat_messages rows are the source of truth)
+        await supabase_service.save_messages_bulk(session_id, user_id, clinic_id, pending_messages)
         
         return ChatResponse(
-            response=reply.content,
-            session_id=session['id'],
-            user_id=user['id'],
+            response=reply_content,
+            session_id=session_id,
+            user_id=user_id,
             clinic_name=clinic_data.get('clinic_name', '')
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Unexpected error in chat endpoint: {e}")
+        logger.exception("Unexpected error in chat endpoint: %s", e)
+
+        # Don't lose the messages of a turn that failed halfway
+        if pending_messages and session_id and user_id:
+            await supabase_service.save_messages_bulk(session_id, user_id, clinic_id, pending_messages)
+
         return ChatResponse(
-            response="I'm sorry, there was an error processing your request. Please try again or contact our support team.",
+            response=ERROR_REPLY,
             session_id="",
             user_id="",
             clinic_name="",
             error=str(e)
         )
 
-def _process_date_argument(args: Dict[str, Any]) -> Dict[str, Any]:
-    """Process and validate date arguments for tool calls"""
-    date_str = args["date"].lower().strip()
-    
-    # Handle relative dates
-    if date_str == "today":
-        args["date"] = datetime.now().strftime("%Y-%m-%d")
-        print(f"🔄 Converted 'today' to: {args['date']}")
-    elif date_str == "tomorrow":
-        tomorrow = datetime.now() + timedelta(days=1)
-        args["date"] = tomorrow.strftime("%Y-%m-%d")
-        print(f"🔄 Converted 'tomorrow' to: {args['date']}")
-    else:
-        # Check if the date is valid and not in the past
+# Pre-/api/v1 clients only ever called POST /chat, so only that route is re-exposed
+legacy_router = APIRouter(tags=["legacy"])
+legacy_router.add_api_route("/chat", chat_endpoint, methods=["POST"], response_model=ChatResponse)
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of /chat (Server-Sent Events).
+
+    Emits `data: {"delta": "..."}` events as the reply is generated, then a final
+    `event: done` carrying session_id, user_id and clinic_name (or `event: error`).
+    When the model calls tools, only the reply after the tool results is streamed.
+    """
+    if not request.message or request.message.isspace():
+        return StreamingResponse(
+            _single_reply_events(EMPTY_MESSAGE_REPLY, {"session_id": "", "user_id": "", "clinic_name": ""}),
+            media_type="text/event-stream"
+        )
+
+    user_input = request.message.strip()
+    clinic_id = request.clinic_id
+    phone_number = request.phone_number
+
+    if not await rate_limiter.hit(phone_number, clinic_id):
+        raise HTTPException(status_code=429, detail="Too many requests, please try again later")
+
+    # Load everything before the response starts so lookup failures still get a proper status code
+    pending_messages = []
+    clinic_data, user_id, session_id, chat_history = await _start_turn(request, user_input, pending_messages)
+    system_prompt = get_system_prompt(clinic_data)
+
+    done_payload = {
+        "session_id": session_id,
+        "user_id": user_id,
+        "clinic_name": clinic_data.get('clinic_name', '')
+    }
+
+    async def events():
         try:
-            parsed_date = datetime.strptime(args["date"], "%Y-%m-%d")
-            today = datetime.now()
-            
-            # If the date is more than 1 year in the past, use today
-            if parsed_date < today - timedelta(days=365):
-                print(f"⚠️ Detected old date {args['date']}, using today instead")
-                args["date"] = today.strftime("%Y-%m-%d")
-            # If date is in the past (but recent), use today
-            elif parsed_date.date() < today.date():
-                print(f"⚠️ Date {args['date']} is in the past, using today instead")
-                args["date"] = today.strftime("%Y-%m-%d")
+            reply_content, cache_entry = await _lookup_cached_reply(clinic_id, session_id, system_prompt, chat_history, user_input)
+
+            if reply_content is not None:
+                logger.debug("Serving reply from response cache")
+                yield _sse({"delta": reply_content})
             else:
-                print(f"✅ Using date: {args['date']}")
-        except ValueError:
-            # If date parsing fails, use today
-            print(f"❌ Invalid date format {args['date']}, using today")
-            args["date"] = datetime.now().strftime("%Y-%m-%d")
+                parts = []
+                tool_calls = {}
+                async for delta in _stream_completion(chat_history, system_prompt, tool_calls):
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+
+                if tool_calls:
+                    tool_calls_data = [tool_calls[index] for index in sorted(tool_calls)]
+                    await _run_tool_calls(
+                        "".join(parts) or None, tool_calls_data, chat_history, pending_messages,
+                        clinic_data, clinic_id, user_id, phone_number
+                    )
+
+                    parts = []
+                    async for delta in _stream_completion(chat_history, system_prompt):
+                        parts.append(delta)
+                        yield _sse({"delta": delta})
+                    reply_content = "".join(parts)
+                else:
+                    reply_content = "".join(parts)
+                    await _store_cached_reply(cache_entry, reply_content)
+
+            chat_history.append({"role": "assistant", "content": reply_content})
+            pending_messages.append(_pending_message("assistant", reply_content))
+
+            await supabase_service.save_messages_bulk(session_id, user_id, clinic_id, pending_messages)
+            yield _sse(done_payload, event="done")
+
+        except Exception as e:
+            logger.exception("Unexpected error in chat stream: %s", e)
+
+            # Don't lose the messages of a turn that failed halfway
+            await supabase_service.save_messages_bulk(session_id, user_id, clinic_id, pending_messages)
+            yield _sse({"response": ERROR_REPLY, "error": str(e)}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+EMPTY_MESSAGE_REPLY = "I'm here to help you. Please let me know what you need assistance with."
+ERROR_REPLY = "I'm sorry, there was an error processing your request. Please try again or contact our support team."
+
+async def _start_turn(request: ChatRequest, user_input: str, pending_messages: List[Dict[str, Any]]):
+    """Load clinic data, user/session ids and recent history, and add the user's message to both"""
+    clinic_id = request.clinic_id
+
+    # 1-3. Get clinic data, and get or create the user and chat session (one round-trip), concurrently
+    clinic_data, ids = await asyncio.gather(
+        supabase_service.get_clinic_data(clinic_id),
+        supabase_service.ensure_user_and_session(request.phone_number, clinic_id, request.user_name)
+    )
+    if not clinic_data:
+        raise HTTPException(status_code=404, detail=f"Clinic not found: {clinic_id}")
+    if not ids:
+        raise HTTPException(status_code=500, detail="Failed to manage user session")
+    
+    # 4. Load the recent chat history window
+    chat_history = await supabase_service.get_chat_history(ids['session_id'], limit=MAX_CTX)
+    
+    # 5. Add current user message to history and queue it for saving
+    chat_history.append({"role": "user", "content": user_input})
+    pending_messages.append(_pending_message("user", user_input))
+
+    return clinic_data, ids['user_id'], ids['session_id'], chat_history
+
+async def _lookup_cached_reply(
+    clinic_id: str,
+    session_id: str,
+    system_prompt: str,
+    chat_history: List[Dict[str, Any]],
+    user_input: str
+):
+    """
+    Exact-match cache lookup, then semantic lookup on the user's message.
+    Returns (reply or None, cache entry to pass to _store_cached_reply).
+    """
+    cache_key = cache_service.make_key(clinic_id, system_prompt, chat_history)
+    reply_content = await cache_service.get(cache_key)
+
+    embedding = None
+    semantic_scope = None
+    if reply_content is None and cache_service.semantic_enabled:
+        semantic_scope = cache_service.make_semantic_scope(clinic_id, session_id, system_prompt, chat_history)
+        embedding = await openai_service.embed(user_input)
+        reply_content = cache_service.lookup_semantic(semantic_scope, embedding)
+
+    return reply_content, (cache_key, semantic_scope, embedding)
+
+async def _store_cached_reply(cache_entry, reply_content: str) -> None:
+    if not reply_content:
+        return
+    cache_key, semantic_scope, embedding = cache_entry
+    await cache_service.set(cache_key, reply_content)
+    cache_service.store_semantic(semantic_scope, embedding, reply_content)
+
+# Tool results stored/sent as JSON; anything else is sent as its str()
+_DUMPERS = {list: orjson.dumps, dict: orjson.dumps}
+
+async def _run_tool_calls(
+    content: str,
+    tool_calls_data: List[Dict[str, Any]],
+    chat_history: List[Dict[str, Any]],
+    pending_messages: List[Dict[str, Any]],
+    clinic_data: Dict[str, Any],
+    clinic_id: str,
+    user_id: str,
+    phone_number: str
+) -> None:
+    """Record the assistant's tool call message, execute the calls and record their results"""
+    # Add the assistant's tool call message to history and queue it for saving
+    chat_history.append({
+        "role": "assistant", 
+        "content": content,
+        "tool_calls": tool_calls_data
+    })
     
-    return args
\ No newline at end of file
+    pending_messages.append(_pending_message("assistant", content, tool_calls=tool_calls_data))
+    
+    # Execute all tool calls concurrently; results come back in tool_call order
+    results = await asyncio.gather(
+        *[
+            _execute_tool(tool_call["function"], clinic_data, clinic_id, user_id, phone_number)
+            for tool_call in tool_calls_data
+        ],
+        return_exceptions=True
+    )
+
+    for tool_call, result in zip(tool_calls_data, results):
+        fn_name = tool_call["function"]["name"]
+        if isinstance(result, BaseException):
+            logger.error("Error executing %s: %s", fn_name, result)
+            result = f"Error executing function: {str(result)}"
+
+        # Add function result to chat history (tools return str or list, see app/utils/functions.py)
+        dumper = _DUMPERS.get(type(result))
+        tool_result_content = dumper(result).decode() if dumper else str(result)
+
+        chat_history.append({
+            "role": "tool",
+            "tool_call_id": tool_call["id"],
+            "name": fn_name,
+            "content": tool_result_content
+        })
+        # Lists/dicts are stored as JSONB without a string round-trip
+        pending_messages.append(_pending_message(
+            "tool", result if dumper else tool_result_content,
+            tool_call_id=tool_call["id"], function_name=fn_name
+        ))
+
+async def _stream_completion(chat_history: List[Dict[str, Any]], system_prompt: str, tool_calls: Dict[int, Dict[str, Any]] = None):
+    """
+    Yield content deltas of a streamed completion.
+    Tool call fragments are accumulated into `tool_calls` (keyed by index) when given.
+    """
+    stream = await openai_service.stream_openai(chat_history[-MAX_CTX:], system_prompt)
+    # Closing the stream hands its connection back to the pool even if the client disconnects mid-reply
+    async with stream:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                yield delta.content
+
+            if tool_calls is not None and delta.tool_calls:
+                for fragment in delta.tool_calls:
+                    entry = tool_calls.setdefault(fragment.index, {
+                        "id": None,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if fragment.id:
+                        entry["id"] = fragment.id
+                    if fragment.function:
+                        if fragment.function.name:
+                            entry["function"]["name"] += fragment.function.name
+                        if fragment.function.arguments:
+                            entry["function"]["arguments"] += fragment.function.arguments
+
+def _sse(payload: Dict[str, Any], event: str = None) -> bytes:
+    data = b"data: " + orjson.dumps(payload) + b"\n\n"
+    return b"event: " + event.encode() + b"\n" + data if event else data
+
+async def _single_reply_events(reply: str, done_payload: Dict[str, Any]):
+    yield _sse({"delta": reply})
+    yield _sse(done_payload, event="done")
+
+def _pending_message(
+    role: str,
+    content: Any,
+    tool_calls: List[Dict[str, Any]] = None,
+    tool_call_id: str = None,
+    function_name: str = None
+) -> Dict[str, Any]:
+    """Build a chat_messages row for save_messages_bulk, timestamped when the message is produced"""
+    return {
+        "role": role,
+        "content": content,
+        "tool_calls": tool_calls,
+        "tool_call_id": tool_call_id,
+        "function_name": function_name,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+async def _execute_tool(
+    function: Dict[str, Any],
+    clinic_data: Dict[str, Any],
+    clinic_id: str,
+    user_id: str,
+    phone_number: str
+) -> Any:
+    """Execute a single tool call requested by the model and return its result"""
+    fn_name = function["name"]
+
+    try:
+        args = orjson.loads(function["arguments"])
+
+        # Handle date conversions for available_slots
+        if fn_name == "available_slots" and "date" in args:
+            args = _process_date_argument(args)
+
+        if fn_name == "available_slots":
+            logger.debug("Getting slots for service %s on %s", args['service'], args['date'])
+            return await available_slots(
+                service=args["service"],
+                date=args["date"],
+                clinic_data=clinic_data
+            )
+
+        if fn_name == "book_appointment":
+            logger.debug("Booking appointment for service %s", args['service'])
+            result = await book_appointment(
+                service=args["service"],
+                patient_name=args["patient_name"],
+                slot=args["slot"],
+                patient_phone=args.get("patient_phone", phone_number),
+                clinic_data=clinic_data
+            )
+
+            # If booking was successful, save appointment to database
+            if isinstance(result, str) and "✅ Appointment Confirmed!" in result:
+                appointment_details = {
+                    'patient_name': args["patient_name"],
+                    'patient_phone': args.get("patient_phone", phone_number),
+                    'service': args["service"],
+                    'appointment_time_utc': args["slot"],
+                    'duration_minutes': 30,  # Default, should be extracted from clinic data
+                    'doctor_email': None,  # Should be extracted from clinic data
+                    'event_id': None,
+                    'event_link': None
+                }
+
+                await supabase_service.save_appointment(
+                    user_id, clinic_id, appointment_details
+                )
+
+            return result
+
+        return "Unknown function"
+
+    except Exception as e:
+        logger.error("Error executing %s: %s", fn_name, e)
+        return f"Error executing function: {str(e)}"
+
+# Relative dates the model commonly sends, as day offsets from today
+_RELATIVE_DATES = {"today": 0, "tomorrow": 1}
+
+def _process_date_argument(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Process and validate date arguments for tool calls"""
+    args["date"] = _canonicalize_date(args["date"].lower().strip(), _today())
+    return args
+
+@lru_cache(maxsize=1024)
+def _canonicalize_date(date_str: str, today_iso: str) -> str:
+    """
+    Resolve a model-supplied date to YYYY-MM-DD, never earlier than today.
+    Keyed on today's date so cached answers roll over at midnight.
+    """
+    today = date.fromisoformat(today_iso)
+
+    offset = _RELATIVE_DATES.get(date_str)
+    if offset is not None:
+        resolved = (today + timedelta(days=offset)).isoformat()
+        logger.debug("Converted '%s' to %s", date_str, resolved)
+        return resolved
+
+    # Check if the date is valid and not in the past
+    try:
+        parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        logger.debug("Invalid date format %s, using today", date_str)
+        return today_iso
+
+    if parsed_date < today:
+        logger.debug("Date %s is in the past, using today instead", date_str)
+        return today_iso
+
+    logger.debug("Using date %s", date_str)
+    return date_str
@@ -1,4 +1,5 @@
 # app/api/clinics.py
+import asyncio
 from fastapi import APIRouter, HTTPException
 from typing import List
 from app.services.supabase_service import supabase_service
@@ -35,8 +36,8 @@ async def get_clinic_services(clinic_id: str):
 async def list_clinics():
     """List all clinics (for admin purposes)"""
     try:
-        response = supabase_service.supabase.table('clinics').select('clinic_id, clinic_name, address, phone').execute()
-        return [ClinicResponse(**clinic) for clinic in response.data]
+        clinics = await supabase_service.list_clinic_metadata()
+        return [ClinicResponse(**clinic) for clinic in clinics]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -44,11 +45,14 @@ async def list_clinics():
 async def create_clinic(clinic_data: CreateClinicRequest):
     """Create a new clinic (for admin purposes)"""
     try:
-        clinic_response = supabase_service.supabase.table('clinics').insert(clinic_data.dict()).execute()
+        clinic_response = await asyncio.to_thread(
+            supabase_service.supabase.table('clinics').insert(clinic_data.dict()).execute
+        )
         
         if not clinic_response.data:
             raise HTTPException(status_code=500, detail="Failed to create clinic")
         
+        await supabase_service.invalidate_clinic_cache(clinic_data.clinic_id)
         return ClinicResponse(**clinic_response.data[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -12,7 +12,7 @@ async def health_check():
     
     try:
         # Test Supabase connection
-        test_clinic = await supabase_service.get_clinic_data("test")
+        test_clinic = await supabase_service.get_clinic_metadata("test")
         supabase_status = {"connected": True, "error": None}
     except Exception as e:
         supabase_status = {"connected": False, "error": str(e)}
@@ -18,7 +18,7 @@ async def get_user_chat_history(phone_number: str, clinic_id: str = Query(...)):
         if not session:
             return UserHistoryResponse(messages=[], session_id=None, user_id=user['id'])
         
-        chat_history = await supabase_service.get_chat_history(session['id'])
+        chat_history = await supabase_service.get_chat_history(session['id'], limit=50)
         
         return UserHistoryResponse(
             messages=chat_history,
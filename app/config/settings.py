@@ -1,42 +1,93 @@
 import os
 from typing import Optional
 from dotenv import load_dotenv
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-# Load environment variables from .env file
-load_dotenv()
-
-class Settings:
-    def __init__(self):
-        # OpenAI API Key
-        self.openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
-        
-        # Supabase Configuration
-        self.supabase_url: str = os.getenv("SUPABASE_URL", "")
-        self.supabase_anon_key: str = os.getenv("SUPABASE_ANON_KEY", "")
-        self.supabase_service_key: str = os.getenv("SUPABASE_SERVICE_KEY", "")
-        
-        # Google Calendar credentials file
-        self.google_calendar_credentials_file: str = os.getenv(
-            "GOOGLE_CALENDAR_CREDENTIALS_FILE", 
-            "credentials/google-credentials.json"
-        )
-        
-        # Timezone & hours
-        self.default_timezone: str = os.getenv("DEFAULT_TIMEZONE", "Asia/Karachi")
-        self.default_start_hour: int = int(os.getenv("DEFAULT_START_HOUR", "9"))
-        self.default_end_hour: int = int(os.getenv("DEFAULT_END_HOUR", "19"))
-        self.default_appointment_duration: int = int(os.getenv("DEFAULT_APPOINTMENT_DURATION", "30"))
-        
-        # API settings
-        self.api_host: str = os.getenv("API_HOST", "0.0.0.0")
-        self.api_port: int = int(os.getenv("API_PORT", "8000"))
-        self.debug: bool = os.getenv("DEBUG", "False").lower() == "true"
-        self.log_level: str = os.getenv("LOG_LEVEL", "INFO")
-        
-        # Session and rate limiting
-        # self.session_timeout_hours: int = int(os.getenv("SESSION_TIMEOUT_HOURS", "24"))
-        self.rate_limit_requests: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
-        self.rate_limit_window: int = int(os.getenv("RATE_LIMIT_WINDOW", "3600"))
+# Load environment variables from .env file (in production they come from the container)
+if os.getenv("ENV") != "production":
+    load_dotenv()
+
+class Settings(BaseSettings):
+    # Parsed and validated once from the environment; field names map to upper-case env vars
+    model_config = SettingsConfigDict(frozen=True, extra="ignore")
+
+    # OpenAI API Key
+    openai_api_key: str = ""
+    openai_max_connections: int = 200
+    openai_max_keepalive_connections: int = 50
+    openai_timeout: float = 30.0
+    openai_connect_timeout: float = 5.0
+    openai_max_retries: int = 2
+    
+    # Supabase Configuration
+    supabase_url: str = ""
+    supabase_anon_key: str = ""
+    supabase_service_key: str = ""
+    # Keep-alive HTTP/2 pool shared by all PostgREST calls
+    supabase_max_connections: int = 50
+    supabase_max_keepalive_connections: int = 20
+    supabase_http_timeout: float = 120.0
+
+    # Direct Postgres connection for the hot chat path (optional, falls back to REST)
+    database_url: str = Field("", validation_alias="SUPABASE_DB_URL")
+    db_pool_size: int = 20
+    # Must be 0 behind a transaction-mode pooler (pgbouncer), which can't keep prepared
+    # statements across transactions; forced to 0 when SUPABASE_DB_URL uses port 6543
+    db_statement_cache_size: int = 100
+    # chat_sessions.last_message_at updates are coalesced and written this often (seconds)
+    session_touch_interval: float = 2.0
+    # Recent messages kept in memory per session; each turn then only reads newer rows
+    history_cache_ttl: int = 1800
+    history_cache_max_entries: int = 10000
+    # Seconds behind the newest cached message that each turn re-reads (turns written late)
+    history_cache_overlap: float = 120.0
+    
+    # Google Calendar credentials file
+    google_calendar_credentials_file: str = "credentials/google-credentials.json"
+    
+    # Timezone & hours
+    default_timezone: str = "Asia/Karachi"
+    default_start_hour: int = 9
+    default_end_hour: int = 19
+    default_appointment_duration: int = 30
+
+    # Google Calendar freebusy results are reused for this many seconds
+    freebusy_cache_ttl: int = 30
+    # Threads for blocking Google Calendar API calls
+    calendar_max_workers: int = 8
+    calendar_http_timeout: int = 10
+    
+    # API settings
+    api_host: str = "0.0.0.0"
+    api_port: int = 8000
+    # Worker processes started by `python main.py` (ignored while reloading)
+    api_workers: int = 1
+    debug: bool = False
+    log_level: str = "INFO"
+    # Comma-separated browser origins allowed to call the API; "*" allows any (without credentials)
+    cors_origins: str = "*"
+    # Default executor size for blocking calls made via asyncio.to_thread
+    thread_pool_workers: int = 10
+    
+    # Session and rate limiting
+    # session_timeout_hours: int = 24
+    rate_limit_requests: int = 100
+    rate_limit_window: int = 3600
+
+    # Clinic data cache
+    clinic_cache_ttl: int = 300
+    clinic_cache_max_entries: int = 1024
+    # Shared copy in Redis (REDIS_URL) so workers don't each reload a clinic
+    clinic_redis_cache_ttl: int = 300
+
+    # Response cache (L1 in-process, L2 Redis, semantic fallback)
+    redis_url: str = ""
+    response_cache_ttl: int = 86400
+    response_cache_max_entries: int = 1024
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.92
+    embedding_model: str = "text-embedding-3-small"
 
     def validate(self) -> bool:
         required = [
@@ -6,10 +6,16 @@ Contains business logic services for:
 - Supabase database operations
 - OpenAI API integration
 - Google Calendar integration
+- Response caching (in-process + Redis)
+- Direct Postgres connection pool (asyncpg)
+- Per-user rate limiting
 """
 
 from .supabase_service import supabase_service
 from .openai_service import openai_service
 from .calendar_service import calendar_service
+from .cache_service import cache_service
+from .pg_pool import pg_pool
+from .rate_limiter import rate_limiter
 
-__all__ = ["supabase_service", "openai_service", "calendar_service"]
\ No newline at end of file
+__all__ = ["supabase_service", "openai_service", "calendar_service", "cache_service", "pg_pool", "rate_limiter"]
\ No newline at end of file
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+# Redis (L2 cache) is optional - the in-process L1 cache works without it
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# numpy is only needed for the semantic (embedding) lookup
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+import orjson
+from cachetools import TTLCache
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class CacheService:
+    """
+    Response cache in front of the OpenAI chat call.
+
+    - L1: in-process LRU dict keyed on a hash of (clinic_id, system_prompt, chat_history tail)
+    - L2: Redis (shared between workers), same key
+    - Semantic: cosine similarity of the last user turn's embedding against replies
+      cached for the same session/clinic/prompt/preceding assistant message
+    """
+
+    HISTORY_TAIL = 6
+    KEY_PREFIX = "chat_reply:"
+
+    def __init__(self):
+        self.ttl = settings.response_cache_ttl
+        self.max_entries = settings.response_cache_max_entries
+        self.semantic_threshold = settings.semantic_cache_threshold
+        self.semantic_enabled = settings.semantic_cache_enabled and NUMPY_AVAILABLE
+
+        # key -> (expires_at, reply)
+        self._l1: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # scope -> {"matrix": np.ndarray, "replies": [...], "expires": [...]}; a scope expires
+        # one TTL after its last store, and the least recently used go first when full
+        self._semantic: TTLCache = TTLCache(maxsize=self.max_entries, ttl=self.ttl)
+
+        self.redis = None
+        self._initialize_redis()
+
+    def _initialize_redis(self):
+        """Initialize the Redis connection pool if configured"""
+        if not settings.redis_url:
+            logger.info("REDIS_URL not set - response cache is in-process only")
+            return
+
+        if not REDIS_AVAILABLE:
+            logger.error("redis library not installed - response cache is in-process only")
+            return
+
+        try:
+            pool = aioredis.ConnectionPool.from_url(settings.redis_url, decode_responses=True)
+            self.redis = aioredis.Redis(connection_pool=pool)
+            logger.info("Redis response cache initialized")
+        except Exception as e:
+            logger.error("Failed to initialize Redis cache: %s", e)
+            self.redis = None
+
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def make_key(self, clinic_id: str, system_prompt: str, chat_history: List[Dict[str, Any]]) -> str:
+        """Exact-match key over the clinic, prompt and the canonicalized history tail"""
+        tail = orjson.dumps(
+            chat_history[-self.HISTORY_TAIL:],
+            option=orjson.OPT_SORT_KEYS,
+            default=str
+        ).decode()
+        return self._hash(clinic_id, system_prompt, tail)
+
+    def make_semantic_scope(self, clinic_id: str, session_id: str, system_prompt: str, chat_history: List[Dict[str, Any]]) -> str:
+        """
+        Semantic matches are only valid against replies given in the same context,
+        so the scope includes the assistant message the user is responding to.
+        Replies often echo what the user said (names, phone numbers), which a near-miss
+        paraphrase from someone else must not get back, so scopes are per session.
+        """
+        previous_reply = ""
+        for msg in reversed(chat_history[:-1]):
+            if msg.get("role") == "assistant":
+                previous_reply = msg.get("content") or ""
+                break
+        return self._hash(clinic_id, session_id, system_prompt, previous_reply)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up an exact-match reply (L1 first, then L2)"""
+        entry = self._l1.get(key)
+        if entry:
+            expires_at, reply = entry
+            if expires_at > time.monotonic():
+                self._l1.move_to_end(key)
+                return reply
+            self._l1.pop(key, None)
+
+        if not self.redis:
+            return None
+
+        try:
+            reply = await self.redis.get(self.KEY_PREFIX + key)
+        except Exception as e:
+            logger.warning("Redis cache read failed: %s", e)
+            return None
+
+        if reply is not None:
+            self._set_l1(key, reply)
+        return reply
+
+    async def set(self, key: str, reply: str) -> None:
+        """Store a reply in L1 and L2"""
+        self._set_l1(key, reply)
+
+        if not self.redis:
+            return
+
+        try:
+            await self.redis.set(self.KEY_PREFIX + key, reply, ex=self.ttl)
+        except Exception as e:
+            logger.warning("Redis cache write failed: %s", e)
+
+    def _set_l1(self, key: str, reply: str) -> None:
+        self._l1[key] = (time.monotonic() + self.ttl, reply)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+
+    def lookup_semantic(self, scope: str, embedding: Optional[List[float]]) -> Optional[str]:
+        """Return the cached reply whose user turn is most similar to `embedding`, if above threshold"""
+        if not self.semantic_enabled or embedding is None:
+            return None
+
+        entry = self._semantic.get(scope)
+        if not entry:
+            return None
+
+        self._evict_expired(entry)
+        if not entry["replies"]:
+            self._semantic.pop(scope, None)
+            return None
+
+        vector = self._normalize(embedding)
+        scores = entry["matrix"] @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.semantic_threshold:
+            return entry["replies"][best]
+        return None
+
+    def store_semantic(self, scope: str, embedding: Optional[List[float]], reply: str) -> None:
+        """Remember a reply for semantic lookup"""
+        if not self.semantic_enabled or embedding is None:
+            return
+
+        vector = self._normalize(embedding)
+        entry = self._semantic.get(scope)
+        if entry is None:
+            self._semantic[scope] = {
+                "matrix": vector.reshape(1, -1),
+                "replies": [reply],
+                "expires": [time.monotonic() + self.ttl]
+            }
+            return
+
+        # Re-inserting restarts the scope's TTL
+        self._semantic[scope] = entry
+
+        self._evict_expired(entry)
+        entry["matrix"] = np.vstack([entry["matrix"], vector]) if entry["replies"] else vector.reshape(1, -1)
+        entry["replies"].append(reply)
+        entry["expires"].append(time.monotonic() + self.ttl)
+
+        overflow = len(entry["replies"]) - self.max_entries
+        if overflow > 0:
+            entry["matrix"] = entry["matrix"][overflow:]
+            entry["replies"] = entry["replies"][overflow:]
+            entry["expires"] = entry["expires"][overflow:]
+
+    def _evict_expired(self, entry: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        # Entries are appended in insertion order, so expired ones form a prefix
+        expired = 0
+        for expires_at in entry["expires"]:
+            if expires_at > now:
+                break
+            expired += 1
+        if expired:
+            entry["matrix"] = entry["matrix"][expired:]
+            entry["replies"] = entry["replies"][expired:]
+            entry["expires"] = entry["expires"][expired:]
+
+    @staticmethod
+    def _normalize(embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def close(self) -> None:
+        """Release the Redis connection pool"""
+        if self.redis:
+            await self.redis.aclose()
+
+# Create global instance
+cache_service = CacheService()
@@ -1,27 +1,156 @@
 import json
 import asyncio
+import functools
+import importlib.util
+import logging
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta, time as dt_time
 from typing import Dict, Any, List, Optional, Tuple
 from zoneinfo import ZoneInfo
+from cachetools import LRUCache, TTLCache
 import os
 import json
-# Google Calendar imports
-try:
-    from google.oauth2.service_account import Credentials
-    from googleapiclient.discovery import build
-    from googleapiclient.errors import HttpError
-    GOOGLE_AVAILABLE = True
-except ImportError:
-    GOOGLE_AVAILABLE = False
 
 from app.config.settings import settings
 
+logger = logging.getLogger(__name__)
+
+_UTC = ZoneInfo("UTC")
+
+# Leading minutes of a service duration such as "30 minutes"
+_DURATION_RE = re.compile(r'^\s*(\d+)')
+
+# Google Calendar libraries are imported when the service is initialized, not at module import
+_GOOGLE_MODULES = ('google.oauth2', 'googleapiclient', 'google_auth_httplib2', 'httplib2')
+
+@functools.lru_cache(maxsize=1)
+def _google_libraries_installed() -> bool:
+    try:
+        return all(importlib.util.find_spec(name) is not None for name in _GOOGLE_MODULES)
+    except ImportError:
+        return False
+
+@functools.lru_cache(maxsize=64)
+def _zi(name: str) -> ZoneInfo:
+    """Cached ZoneInfo lookup for clinic timezones"""
+    return ZoneInfo(name)
+
+def _execute_freebusy(service, body: Dict[str, Any]) -> Dict[str, Any]:
+    return service.freebusy().query(body=body).execute()
+
+def _execute_insert(service, calendar_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return service.events().insert(calendarId=calendar_id, body=body).execute()
+
+def _merge_busy_periods(busy_periods: List[Tuple[datetime, datetime]]) -> Tuple[List[datetime], List[datetime]]:
+    """Sort busy periods and merge overlapping ones; returns parallel (starts, ends) lists"""
+    starts: List[datetime] = []
+    ends: List[datetime] = []
+    for busy_start, busy_end in sorted(busy_periods):
+        if ends and busy_start <= ends[-1]:
+            if busy_end > ends[-1]:
+                ends[-1] = busy_end
+        else:
+            starts.append(busy_start)
+            ends.append(busy_end)
+    return starts, ends
+
+if sys.version_info >= (3, 11):
+    def _parse_gcal_ts(value: str) -> datetime:
+        """Parse an RFC 3339 timestamp from the Calendar API (fromisoformat accepts 'Z' since 3.11)"""
+        return datetime.fromisoformat(value)
+else:
+    def _parse_gcal_ts(value: str) -> datetime:
+        """Parse an RFC 3339 timestamp from the Calendar API"""
+        if value.endswith('Z'):
+            return datetime.fromisoformat(value[:-1]).replace(tzinfo=_UTC)
+        return datetime.fromisoformat(value)
+
+def _parse_target_date(date_str: str) -> date:
+    """Date part of a YYYY-MM-DD or ISO datetime string"""
+    if 'T' in date_str:
+        return _parse_gcal_ts(date_str).date()
+    return datetime.fromisoformat(date_str).date()
+
+def _available_intervals(
+    start_utc: datetime,
+    end_utc: datetime,
+    busy_starts: List[datetime],
+    busy_ends: List[datetime]
+) -> List[Tuple[datetime, datetime]]:
+    """Subtract (merged, sorted) busy periods from [start_utc, end_utc) in one sweep"""
+    intervals = []
+    cursor = start_utc
+    for busy_start, busy_end in zip(busy_starts, busy_ends):
+        if busy_end <= cursor:
+            continue
+        if busy_start >= end_utc:
+            break
+        if busy_start > cursor:
+            intervals.append((cursor, busy_start))
+        cursor = busy_end
+    if cursor < end_utc:
+        intervals.append((cursor, end_utc))
+    return intervals
+
+def _slots_within(
+    all_slots: List[Dict[str, Any]],
+    duration_minutes: int,
+    intervals: List[Tuple[datetime, datetime]]
+) -> List[Dict[str, Any]]:
+    """Keep the (ascending) slots that fit entirely inside one of the free intervals"""
+    available_slots = []
+    slot_length = timedelta(minutes=duration_minutes)
+    idx = 0
+    for slot in all_slots:
+        slot_start_utc = datetime.fromisoformat(slot['datetime_utc'])
+        slot_end_utc = slot_start_utc + slot_length
+
+        # Intervals ending before this slot ends can't hold it or any later slot
+        while idx < len(intervals) and intervals[idx][1] < slot_end_utc:
+            idx += 1
+        if idx == len(intervals):
+            break
+        if intervals[idx][0] <= slot_start_utc:
+            available_slots.append(slot)
+    return available_slots
+
 class CalendarService:
     def __init__(self):
         self.credentials = None
         self.service = None
         self.calendar_timezone = 'UTC'
-        self._initialize_service()
+        # (doctor_email, clinic-local date) -> merged busy periods; short-lived so
+        # "show slots" followed by "book 3pm" doesn't hit Google twice
+        self._fb_cache: TTLCache = TTLCache(maxsize=4096, ttl=settings.freebusy_cache_ttl)
+        # id(clinic_data / doctor) -> (object, service lookup index)
+        self._index_cache: LRUCache = LRUCache(maxsize=1024)
+        # Google API calls are blocking; keep them on their own bounded pool
+        self._executor = ThreadPoolExecutor(max_workers=settings.calendar_max_workers, thread_name_prefix="gcal")
+        # Initialization (imports, credentials, a Google API round-trip) runs once, at app
+        # startup (see main.py lifespan) or on first use
+        self._init_future: Optional[asyncio.Future] = None
+
+    @property
+    def google_available(self) -> bool:
+        """Whether the Google client libraries are installed (checked without importing them)"""
+        return _google_libraries_installed()
+
+    async def startup(self) -> None:
+        """Initialize the Google Calendar client off the event loop"""
+        if self._init_future is None:
+            self._init_future = asyncio.ensure_future(self._run_blocking(self._initialize_service))
+        await self._init_future
+
+    async def _run_blocking(self, func, *args):
+        """asyncio.to_thread equivalent on the calendar's own bounded pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _get_service(self):
+        if self._init_future is None or not self._init_future.done():
+            await self.startup()
+        return self.service
 
     # def _initialize_service(self):
     #     """Initialize Google Calendar service"""
@@ -56,8 +185,13 @@ class CalendarService:
     def _initialize_service(self):
         """Initialize Google Calendar service with environment variable support"""
         try:
-            if not GOOGLE_AVAILABLE:
-                print("❌ Google Calendar libraries not installed.")
+            try:
+                from google.oauth2.service_account import Credentials
+                from googleapiclient.discovery import build
+                import google_auth_httplib2
+                import httplib2
+            except ImportError:
+                logger.error("Google Calendar libraries not installed")
                 return
 
             # Method 1: Try environment variable first (for production/Render)
@@ -70,9 +204,9 @@ class CalendarService:
                         credentials_info,
                         scopes=['https://www.googleapis.com/auth/calendar']
                     )
-                    print("✅ Google Calendar credentials loaded from environment variable")
+                    logger.info("Google Calendar credentials loaded from environment variable")
                 except json.JSONDecodeError as e:
-                    print(f"❌ Invalid JSON in GOOGLE_CREDENTIALS_JSON: {e}")
+                    logger.error("Invalid JSON in GOOGLE_CREDENTIALS_JSON: %s", e)
                     return
             else:
                 # Method 2: Fallback to file (for local development)
@@ -82,87 +216,142 @@ class CalendarService:
                         creds_file,
                         scopes=['https://www.googleapis.com/auth/calendar']
                     )
-                    print("✅ Google Calendar credentials loaded from file")
+                    logger.info("Google Calendar credentials loaded from file")
                 else:
-                    print(f"❌ No credentials found. Set GOOGLE_CREDENTIALS_JSON environment variable or provide file at {creds_file}")
+                    logger.error("No credentials found. Set GOOGLE_CREDENTIALS_JSON environment variable or provide file at %s", creds_file)
                     return
 
             # Initialize the service
             if self.credentials:
-                self.service = build('calendar', 'v3', credentials=self.credentials)
+                # One authorized transport for every call (keep-alive, gzip via httplib2), and
+                # the discovery document bundled with googleapiclient instead of a cache lookup
+                http = google_auth_httplib2.AuthorizedHttp(
+                    self.credentials,
+                    http=httplib2.Http(timeout=settings.calendar_http_timeout)
+                )
+                self.service = build('calendar', 'v3', http=http, cache_discovery=False, static_discovery=True)
                 
                 # Get calendar timezone
                 calendar_settings = self.service.calendars().get(calendarId='primary').execute()
                 self.calendar_timezone = calendar_settings.get('timeZone', 'UTC')
                 
-                print("✅ Google Calendar service initialized successfully")
-                print(f"📍 Calendar timezone: {self.calendar_timezone}")
+                logger.info("Google Calendar service initialized (timezone %s)", self.calendar_timezone)
             else:
-                print("❌ Failed to load credentials")
+                logger.error("Failed to load Google Calendar credentials")
                 self.service = None
 
         except Exception as e:
-            print(f"❌ Failed to initialize calendar service: {e}")
+            logger.error("Failed to initialize calendar service: %s", e)
             self.service = None
             
     def _find_doctor_for_service(self, service: str, clinic_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Find the appropriate doctor for a given service"""
+        match = self.match_service(service, clinic_data)
+        if match is None:
+            logger.debug("No doctor found for service: '%s'", service)
+            return None
+        return match[0]
+
+    def match_service(self, service: str, clinic_data: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str, int, bool]]:
+        """
+        (doctor, service name, duration minutes, exact) for a requested service: a case-insensitive
+        exact match on any doctor first, then the first partial match in doctor order
+        """
         if not clinic_data or 'Doctors' not in clinic_data:
             return None
         
         service_lower = service.lower()
-        # print(f"🔍 Looking for doctor who provides service: '{service}'")
-        
-        for doctor in clinic_data['Doctors']:
-            doctor_services = doctor.get('Services', {})
-            # print(f"   Checking Dr. {doctor.get('Name')}: {list(doctor_services.keys())}")
-            
-            # Check for exact match first
-            for available_service in doctor_services:
-                if available_service.lower() == service_lower:
-                    # print(f"✅ Found exact match: Dr. {doctor.get('Name')} provides '{available_service}'")
-                    return doctor
-            
-            # Check for partial match
-            for available_service in doctor_services:
-                if service_lower in available_service.lower() or available_service.lower() in service_lower:
-                    # print(f"✅ Found partial match: Dr. {doctor.get('Name')} provides '{available_service}' for requested '{service}'")
-                    return doctor
+        exact_matches, all_services = self._get_service_index(clinic_data)
+
+        doctor = exact_matches.get(service_lower)
+        if doctor is not None:
+            return (doctor, *self._get_doctor_services(doctor)[service_lower], True)
+
+        # Then a single pass for a partial match
+        for service_key, doctor in all_services:
+            if service_lower in service_key or service_key in service_lower:
+                return (doctor, *self._get_doctor_services(doctor)[service_key], False)
         
-        print(f"❌ No doctor found for service: '{service}'")
         return None
 
     def _get_service_duration(self, doctor: Dict[str, Any], service: str) -> Tuple[int, str]:
         """Get service duration from doctor's services"""
-        services = doctor.get('Services', {})
+        services = self._get_doctor_services(doctor)
         service_lower = service.lower()
         
         # Check for exact match first
-        for available_service, duration_str in services.items():
-            if available_service.lower() == service_lower:
-                try:
-                    duration_minutes = int(duration_str.split()[0])
-                    # print(f"✅ Service '{available_service}' duration: {duration_minutes} minutes")
-                    return duration_minutes, available_service
-                except (ValueError, IndexError):
-                    print(f"⚠️ Could not parse duration for '{available_service}': {duration_str}")
-                    return 30, available_service
+        match = services.get(service_lower)
+        if match is not None:
+            return match[1], match[0]
         
         # Check for partial match
-        for available_service, duration_str in services.items():
-            if service_lower in available_service.lower() or available_service.lower() in service_lower:
-                try:
-                    duration_minutes = int(duration_str.split()[0])
-                    # print(f"✅ Service '{available_service}' (matched '{service}') duration: {duration_minutes} minutes")
-                    return duration_minutes, available_service
-                except (ValueError, IndexError):
-                    # print(f"⚠️ Could not parse duration for '{available_service}': {duration_str}")
-                    return 30, available_service
+        for service_key, (available_service, duration_minutes) in services.items():
+            if service_lower in service_key or service_key in service_lower:
+                return duration_minutes, available_service
         
-        print(f"⚠️ Service '{service}' not found, using default 30 minutes")
+        logger.warning("Service '%s' not found, using default 30 minutes", service)
         return 30, service
 
+    def _get_service_index(self, clinic_data: Dict[str, Any]):
+        """
+        ({service_lower: doctor} for exact matches, [(service_lower, doctor)] in doctor order
+        for partial matches), built once per clinic_data object
+        """
+        def build():
+            exact_matches = {}
+            all_services = []
+            for doctor in clinic_data.get('Doctors', []):
+                for service_key in self._get_doctor_services(doctor):
+                    exact_matches.setdefault(service_key, doctor)
+                    all_services.append((service_key, doctor))
+            return exact_matches, all_services
+
+        return self._memoize_on('service_index', clinic_data, build)
+
+    def service_minutes(self, doctor: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """
+        {service name: duration minutes} for a doctor's "30 min"-style durations, parsed once per
+        doctor object; None where the duration has no leading number
+        """
+        def build():
+            minutes = {}
+            for available_service, duration_str in doctor.get('Services', {}).items():
+                match = _DURATION_RE.match(str(duration_str))
+                if match is None:
+                    logger.warning("Could not parse duration for '%s': %s", available_service, duration_str)
+                minutes[available_service] = int(match.group(1)) if match else None
+            return minutes
+
+        return self._memoize_on('service_minutes', doctor, build)
+
+    def _get_doctor_services(self, doctor: Dict[str, Any]) -> Dict[str, Tuple[str, int]]:
+        """{service_lower: (service name, duration minutes)} for a doctor, built once per doctor object"""
+        def build():
+            services = {}
+            for available_service, minutes in self.service_minutes(doctor).items():
+                services.setdefault(available_service.lower(), (available_service, 30 if minutes is None else minutes))
+            return services
+
+        return self._memoize_on('doctor_services', doctor, build)
+
+    def _memoize_on(self, kind: str, source: Dict[str, Any], build):
+        # Keyed by id(); the entry keeps a reference to `source` so the id can't be reused
+        # while cached, and a reloaded clinic_data (new object) simply gets a new entry
+        key = (kind, id(source))
+        entry = self._index_cache.get(key)
+        if entry is not None and entry[0] is source:
+            return entry[1]
+        value = build()
+        self._index_cache[key] = (source, value)
+        return value
+
     def _parse_clinic_hours(self, clinic_data: Dict[str, Any]) -> Tuple[int, int]:
+        """Clinic working hours, parsed once per clinic_data object"""
+        if not clinic_data:
+            return self._compute_clinic_hours({})
+        return self._memoize_on('clinic_hours', clinic_data, lambda: self._compute_clinic_hours(clinic_data))
+
+    def _compute_clinic_hours(self, clinic_data: Dict[str, Any]) -> Tuple[int, int]:
         """Parse clinic working hours from clinic data"""
         try:
             # Method 1: Check config.working_hours
@@ -186,7 +375,7 @@ class CalendarService:
             return start_hour, end_hour
             
         except Exception as e:
-            print(f"❌ Error parsing clinic hours: {e}, using default 9AM-7PM")
+            logger.error("Error parsing clinic hours: %s, using default 9AM-7PM", e)
             return 9, 19
 
     async def get_available_slots(
@@ -199,22 +388,19 @@ class CalendarService:
         """Get available slots for a service (finds appropriate doctor automatically)"""
         try:
             # Parse the target date
-            if 'T' in date_str:
-                target_date = datetime.fromisoformat(date_str.replace('Z', '+00:00')).date()
-            else:
-                target_date = datetime.fromisoformat(date_str).date()
+            target_date = _parse_target_date(date_str)
 
             # print(f"🗓 Getting slots for {target_date} (service: {service})")
             
             # Find the right doctor for this service
             doctor = self._find_doctor_for_service(service, clinic_data)
             if not doctor:
-                print(f"❌ No doctor found for service '{service}'")
+                logger.warning("No doctor found for service '%s'", service)
                 return []
             
             doctor_email = doctor.get('Calendar_email')
             if not doctor_email:
-                print(f"❌ No calendar email found for Dr. {doctor.get('Name')}")
+                logger.warning("No calendar email found for Dr. %s", doctor.get('Name'))
                 return []
             
             # Get service duration
@@ -232,7 +418,7 @@ class CalendarService:
             )
 
         except Exception as e:
-            print(f"❌ Error getting available slots: {e}")
+            logger.error("Error getting available slots: %s", e)
             return []
 
     async def _get_real_calendar_slots(
@@ -244,79 +430,118 @@ class CalendarService:
         clinic_data: Dict[str, Any] = None
     ) -> List[Dict[str, Any]]:
         """Get real calendar slots from Google Calendar"""
-        try:
-            clinic_tz = ZoneInfo(clinic_timezone)
-            utc_tz = ZoneInfo("UTC")
+        slots_by_doctor = await self._get_real_calendar_slots_multi(
+            [doctor_email], target_date, duration_minutes, clinic_timezone, clinic_data
+        )
+        return slots_by_doctor[doctor_email]
 
-            # Get clinic hours
-            start_hour, end_hour = self._parse_clinic_hours(clinic_data or {})
+    async def _get_real_calendar_slots_multi(
+        self,
+        doctor_emails: List[str],
+        target_date: datetime.date,
+        duration_minutes: int,
+        clinic_timezone: str,
+        clinic_data: Dict[str, Any] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get real calendar slots for several doctors with a single freebusy query"""
+        try:
+            window = self._clinic_window_utc(target_date, clinic_timezone, clinic_data)
+            busy_by_doctor = await self._get_busy_periods_for_date(doctor_emails, target_date, window)
 
-            # Create time range in clinic timezone, then convert to UTC
-            start_time_local = datetime.combine(target_date, dt_time(start_hour, 0), tzinfo=clinic_tz)
-            end_time_local = datetime.combine(target_date, dt_time(end_hour, 0), tzinfo=clinic_tz)
-            
-            start_time_utc = start_time_local.astimezone(utc_tz)
-            end_time_utc = end_time_local.astimezone(utc_tz)
-
-            # print(f"🔍 Checking calendar: {doctor_email}")
-            # print(f"📅 Date range: {start_time_local} to {end_time_local} (local)")
-
-            # Query Google Calendar freebusy API
-            freebusy_query = {
-                'timeMin': start_time_utc.isoformat(),
-                'timeMax': end_time_utc.isoformat(),
-                'items': [{'id': doctor_email}],
-                'timeZone': 'UTC'
+            # Every doctor gets the same candidate slots, kept where they fit the doctor's free intervals
+            all_slots = self._generate_time_slots(target_date, duration_minutes, clinic_timezone, clinic_data)
+            return {
+                doctor_email: _slots_within(
+                    all_slots, duration_minutes, _available_intervals(*window, *busy_by_doctor[doctor_email])
+                )
+                for doctor_email in doctor_emails
             }
+            
+        except Exception as e:
+            logger.error("Error getting real calendar slots: %s", e)
+            # return self._generate_default_slots(target_date, duration_minutes, clinic_timezone, clinic_data)
+            return {doctor_email: [] for doctor_email in doctor_emails}  # Return empty lists if error occurs
 
-            freebusy_result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.service.freebusy().query(body=freebusy_query).execute()
-            )
+    def _clinic_window_utc(
+        self,
+        target_date: datetime.date,
+        clinic_timezone: str,
+        clinic_data: Dict[str, Any] = None
+    ) -> Tuple[datetime, datetime]:
+        """Clinic opening hours on target_date, as a UTC (start, end) pair"""
+        clinic_tz = _zi(clinic_timezone)
 
-            # Parse busy periods
-            calendar_data = freebusy_result.get('calendars', {})
-            doctor_calendar = calendar_data.get(doctor_email, {})
-            busy_periods_raw = doctor_calendar.get('busy', [])
-            
+        # Get clinic hours
+        start_hour, end_hour = self._parse_clinic_hours(clinic_data or {})
+
+        # Create time range in clinic timezone, then convert to UTC
+        start_time_local = datetime.combine(target_date, dt_time(start_hour, 0), tzinfo=clinic_tz)
+        end_time_local = datetime.combine(target_date, dt_time(end_hour, 0), tzinfo=clinic_tz)
+        
+        return start_time_local.astimezone(_UTC), end_time_local.astimezone(_UTC)
+
+    async def _get_busy_periods_for_date(
+        self,
+        doctor_emails: List[str],
+        target_date: datetime.date,
+        window: Tuple[datetime, datetime]
+    ) -> Dict[str, Tuple[List[datetime], List[datetime]]]:
+        """Busy periods during the clinic's hours (`window`) on target_date, from the freebusy cache where fresh"""
+        busy_by_doctor = {}
+        missing = []
+        for doctor_email in doctor_emails:
+            cached = self._fb_cache.get((doctor_email, target_date))
+            if cached is not None:
+                busy_by_doctor[doctor_email] = cached
+            else:
+                missing.append(doctor_email)
+
+        if missing:
+            fetched = await self._query_busy_periods(missing, *window)
+            for doctor_email, busy in fetched.items():
+                self._fb_cache[(doctor_email, target_date)] = busy
+            busy_by_doctor.update(fetched)
+
+        return busy_by_doctor
+
+    async def _query_busy_periods(
+        self,
+        doctor_emails: List[str],
+        start_time_utc: datetime,
+        end_time_utc: datetime
+    ) -> Dict[str, Tuple[List[datetime], List[datetime]]]:
+        """
+        One freebusy request for all calendars over [start, end).
+        Returns each calendar's merged busy periods as (starts, ends).
+        """
+        # Query Google Calendar freebusy API
+        freebusy_query = {
+            'timeMin': start_time_utc.isoformat(),
+            'timeMax': end_time_utc.isoformat(),
+            'items': [{'id': doctor_email} for doctor_email in doctor_emails],
+            'timeZone': 'UTC'
+        }
+
+        service = await self._get_service()
+        freebusy_result = await self._run_blocking(_execute_freebusy, service, freebusy_query)
+
+        # Parse busy periods
+        calendar_data = freebusy_result.get('calendars', {})
+        busy_by_doctor = {}
+        for doctor_email in doctor_emails:
             busy_periods = []
-            for busy in busy_periods_raw:
+            for busy in calendar_data.get(doctor_email, {}).get('busy', []):
                 try:
-                    busy_start = datetime.fromisoformat(busy['start'].replace('Z', '+00:00'))
-                    busy_end = datetime.fromisoformat(busy['end'].replace('Z', '+00:00'))
+                    busy_start = _parse_gcal_ts(busy['start'])
+                    busy_end = _parse_gcal_ts(busy['end'])
                     busy_periods.append((busy_start, busy_end))
-                    
-                    busy_start_local = busy_start.astimezone(clinic_tz)
-                    busy_end_local = busy_end.astimezone(clinic_tz)
-                    # print(f"📛 BUSY: {busy_start_local.strftime('%I:%M %p')} - {busy_end_local.strftime('%I:%M %p')}")
                 except Exception as e:
-                    print(f"❌ Error parsing busy period: {e}")
+                    logger.warning("Error parsing busy period: %s", e)
 
-            # Generate and filter slots
-            all_slots = self._generate_time_slots(target_date, duration_minutes, clinic_timezone, clinic_data)
-            available_slots = []
-            
-            for slot in all_slots:
-                slot_start_utc = datetime.fromisoformat(slot['datetime_utc'])
-                slot_end_utc = slot_start_utc + timedelta(minutes=duration_minutes)
-
-                # Check conflicts with busy periods
-                is_free = True
-                for busy_start, busy_end in busy_periods:
-                    if slot_start_utc < busy_end and slot_end_utc > busy_start:
-                        is_free = False
-                        break
-
-                if is_free:
-                    available_slots.append(slot)
-
-            # print(f"📊 Found {len(available_slots)} free slots of {duration_minutes}min each")
-            return available_slots
-            
-        except Exception as e:
-            print(f"❌ Error getting real calendar slots: {e}")
-            # return self._generate_default_slots(target_date, duration_minutes, clinic_timezone, clinic_data)
-            return []  # Return empty list if error occurs
+            # Sort and merge overlapping busy periods so starts and ends are both ascending
+            busy_by_doctor[doctor_email] = _merge_busy_periods(busy_periods)
+
+        return busy_by_doctor
 
     def _generate_time_slots(
         self, 
@@ -327,8 +552,7 @@ class CalendarService:
     ) -> List[Dict[str, Any]]:
         """Generate time slots for a given date (only future slots for today)"""
         slots = []
-        clinic_tz = ZoneInfo(clinic_timezone)
-        utc_tz = ZoneInfo("UTC")
+        clinic_tz = _zi(clinic_timezone)
         
         start_hour, end_hour = self._parse_clinic_hours(clinic_data or {})
         
@@ -372,25 +596,44 @@ class CalendarService:
             current_time_local = datetime.combine(date, dt_time(next_hour, next_minute), tzinfo=clinic_tz)
             # print(f"⏰ Today's slots start from {current_time_local.strftime('%I:%M %p')} (current time: {now_local.strftime('%I:%M %p')})")
         
-        # Generate slots from current_time_local onwards
-        while current_time_local < end_time_local:
-            slot_end_local = current_time_local + timedelta(minutes=duration_minutes)
+        # Generate slots from current_time_local onwards. The UTC offset is fixed for the
+        # day (except across a DST change), so UTC times and the date/zone labels are
+        # derived from one conversion instead of one per slot.
+        base_local = current_time_local
+        base_utc = base_local.astimezone(_UTC)
+        base_offset = base_local.utcoffset()
+        formatted_date = base_local.strftime('%A, %B %d')
+        base_timezone_abbr = base_local.strftime('%Z') or clinic_timezone.split('/')[-1]
+        slot_length = timedelta(minutes=duration_minutes)
+        minute_offset = 0
+
+        while True:
+            current_time_local = base_local + timedelta(minutes=minute_offset)
+            if current_time_local >= end_time_local:
+                break
+
+            slot_end_local = current_time_local + slot_length
             
             # Make sure slot doesn't extend beyond clinic hours
             if slot_end_local > end_time_local:
                 # print(f"🚫 Slot {current_time_local.strftime('%I:%M %p')} would extend beyond clinic hours ({end_hour}:00), stopping")
                 break
             
-            current_time_utc = current_time_local.astimezone(utc_tz)
+            if current_time_local.utcoffset() == base_offset:
+                current_time_utc = base_utc + timedelta(minutes=minute_offset)
+                timezone_abbr = base_timezone_abbr
+            else:
+                # DST transition earlier in the day
+                current_time_utc = current_time_local.astimezone(_UTC)
+                timezone_abbr = current_time_local.strftime('%Z') or clinic_timezone.split('/')[-1]
             
-            # Format for display
-            formatted_date = current_time_local.strftime('%A, %B %d')
-            formatted_time_only = current_time_local.strftime('%I:%M %p')
-            timezone_abbr = current_time_local.strftime('%Z') or clinic_timezone.split('/')[-1]
+            # Format for display (same output as strftime('%I:%M %p') / ('%H:%M'), without the format parsing)
+            hour, minute = current_time_local.hour, current_time_local.minute
+            formatted_time_only = f"{hour % 12 or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
             
             slots.append({
-                'start_time': current_time_local.strftime('%H:%M'),
-                'end_time': slot_end_local.strftime('%H:%M'),
+                'start_time': f"{hour:02d}:{minute:02d}",
+                'end_time': f"{slot_end_local.hour:02d}:{slot_end_local.minute:02d}",
                 'datetime_utc': current_time_utc.isoformat(),
                 'datetime_local': current_time_local.isoformat(),
                 'formatted_time': f"{formatted_date} at {formatted_time_only}",
@@ -402,7 +645,7 @@ class CalendarService:
             })
             
             # print(f"🕐 Generated slot: {formatted_time_only} - {slot_end_local.strftime('%I:%M %p')} ({duration_minutes}min)")
-            current_time_local += timedelta(minutes=duration_minutes)
+            minute_offset += duration_minutes
 
         return slots
 
@@ -443,7 +686,7 @@ class CalendarService:
             )
             
         except Exception as e:
-            print(f"❌ Error booking appointment: {e}")
+            logger.error("Error booking appointment: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -463,10 +706,15 @@ class CalendarService:
     ) -> Dict[str, Any]:
         """Book real Google Calendar appointment"""
         try:
-            start_time_utc = datetime.fromisoformat(appointment_datetime.replace('Z', '+00:00'))
+            start_time_utc = _parse_gcal_ts(appointment_datetime)
             end_time_utc = start_time_utc + timedelta(minutes=duration_minutes)
+            # An offset-qualified extended-format timestamp is already valid RFC 3339; send it as given
+            if start_time_utc.tzinfo is not None and appointment_datetime[10:11] == 'T':
+                start_rfc3339 = appointment_datetime
+            else:
+                start_rfc3339 = start_time_utc.isoformat()
             
-            clinic_tz = ZoneInfo(clinic_timezone)
+            clinic_tz = _zi(clinic_timezone)
             start_time_local = start_time_utc.astimezone(clinic_tz)
             
             # Create calendar event
@@ -483,7 +731,7 @@ Clinic: {clinic_data.get('clinic_name', 'N/A')}
 Address: {clinic_data.get('address', 'N/A')}
                 '''.strip(),
                 'start': {
-                    'dateTime': start_time_utc.isoformat(),
+                    'dateTime': start_rfc3339,
                     'timeZone': 'UTC',
                 },
                 'end': {
@@ -492,13 +740,11 @@ Address: {clinic_data.get('address', 'N/A')}
                 },
             }
 
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.service.events().insert(
-                    calendarId=doctor_email, 
-                    body=event
-                ).execute()
-            )
+            calendar = await self._get_service()
+            result = await self._run_blocking(_execute_insert, calendar, doctor_email, event)
+
+            # The doctor's availability for that day just changed
+            self._fb_cache.pop((doctor_email, start_time_local.date()), None)
 
             timezone_abbr = start_time_local.strftime('%Z') or clinic_timezone.split('/')[-1]
 
@@ -523,16 +769,20 @@ Address: {clinic_data.get('address', 'N/A')}
             }
 
         except Exception as e:
-            print(f"❌ Calendar booking failed: {e}")
+            logger.error("Calendar booking failed: %s", e)
             return {
                 "success": False,
                 "error": f"Calendar booking failed: {str(e)}"
             }
 
+    def shutdown(self) -> None:
+        """Stop the Google API thread pool"""
+        self._executor.shutdown(wait=False)
+
     def get_status(self) -> Dict[str, Any]:
         """Get service status"""
         return {
-            "google_available": GOOGLE_AVAILABLE,
+            "google_available": self.google_available,
             "service_initialized": self.service is not None,
             "credentials_loaded": self.credentials is not None,
             "calendar_timezone": self.calendar_timezone
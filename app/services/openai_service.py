@@ -1,11 +1,19 @@
-from openai import OpenAI
-from typing import List, Dict, Any
+import logging
+import httpx
+from openai import AsyncOpenAI
+from typing import List, Dict, Any, Optional
 from app.config.settings import settings
 
+logger = logging.getLogger(__name__)
+
 class OpenAIService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.tools = [
+        # The async client and its connection pool are created at app startup (see main.py lifespan)
+        self.client: Optional[AsyncOpenAI] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        # Built once and never modified, so every request sends the same tool definitions
+        # in the same order (prompt caching needs a byte-identical prefix)
+        self.tools = (
             {
                 "type": "function",
                 "function": {
@@ -56,34 +64,72 @@ class OpenAIService:
                         "required": ["service", "patient_name", "slot"]
                     }
                 }
-            }
-        ]
+            },
+        )
 
-    def call_openai(self, chat_history: List[Dict[str, Any]], system_prompt: str):
-        """
-        Call OpenAI API with chat history and system prompt
-        """
+    async def startup(self) -> None:
+        """Create the shared AsyncOpenAI client with a pool sized for concurrent chats"""
+        if self.client is not None:
+            return
+
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections
+            )
+        )
+        self.client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=self.http_client,
+            timeout=httpx.Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout),
+            max_retries=settings.openai_max_retries
+        )
+        logger.info("OpenAI async client initialized")
+
+    async def shutdown(self) -> None:
+        """Close the shared client and its connection pool"""
+        if self.client is not None:
+            await self.client.close()
+        self.client = None
+        self.http_client = None
+
+    async def _get_client(self) -> AsyncOpenAI:
+        if self.client is None:
+            await self.startup()
+        return self.client
+
+    def _build_messages(self, chat_history: List[Dict[str, Any]], system_prompt: str) -> List[Dict[str, Any]]:
+        """System prompt + chat history, dropping tool messages that don't answer a preceding tool call"""
         messages = [{"role": "system", "content": system_prompt}]
 
-        # Track whether the last message was a tool_call
-        expecting_tool_response = False
+        # Track the tool_call ids of the last assistant message that still await a response
+        pending_tool_call_ids = set()
 
         for msg in chat_history:
             if msg["role"] == "assistant" and "tool_calls" in msg:
                 messages.append(msg)
-                expecting_tool_response = True
+                pending_tool_call_ids = {tool_call["id"] for tool_call in msg["tool_calls"]}
             elif msg["role"] == "tool":
-                if expecting_tool_response:
+                if msg.get("tool_call_id") in pending_tool_call_ids:
                     messages.append(msg)
-                    expecting_tool_response = False  # Reset after valid tool response
+                    pending_tool_call_ids.discard(msg["tool_call_id"])
                 else:
-                    print("⚠️ Skipping orphan tool message:", msg)
+                    logger.warning("Skipping orphan tool message: %s", msg)
             else:
                 messages.append(msg)
-                expecting_tool_response = False  # Reset for normal messages
+                pending_tool_call_ids = set()  # Reset for normal messages
+
+        return messages
+
+    async def call_openai(self, chat_history: List[Dict[str, Any]], system_prompt: str):
+        """
+        Call OpenAI API with chat history and system prompt
+        """
+        messages = self._build_messages(chat_history, system_prompt)
 
         try:
-            response = self.client.chat.completions.create(
+            client = await self._get_client()
+            response = await client.chat.completions.create(
                 model="gpt-4o",
                 messages=messages,
                 tools=self.tools,
@@ -93,10 +139,31 @@ class OpenAIService:
             )
             return response
         except Exception as e:
-            print(f"❌ OpenAI call failed: {e}")
+            logger.error("OpenAI call failed: %s", e)
+            raise
+
+    async def stream_openai(self, chat_history: List[Dict[str, Any]], system_prompt: str):
+        """
+        Same request as call_openai but streamed; returns the async chunk iterator
+        """
+        messages = self._build_messages(chat_history, system_prompt)
+
+        try:
+            client = await self._get_client()
+            return await client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                tools=self.tools,
+                tool_choice="auto",
+                temperature=0.1,
+                max_tokens=1000,
+                stream=True
+            )
+        except Exception as e:
+            logger.error("OpenAI streaming call failed: %s", e)
             raise
 
-    def call_openai_simple(self, message: str, system_prompt: str = None):
+    async def call_openai_simple(self, message: str, system_prompt: str = None):
         """
         Simple OpenAI call for single message (useful for utilities)
         """
@@ -106,7 +173,8 @@ class OpenAIService:
         messages.append({"role": "user", "content": message})
 
         try:
-            response = self.client.chat.completions.create(
+            client = await self._get_client()
+            response = await client.chat.completions.create(
                 model="gpt-4o",
                 messages=messages,
                 temperature=0.1,
@@ -114,8 +182,24 @@ class OpenAIService:
             )
             return response.choices[0].message.content
         except Exception as e:
-            print(f"❌ Simple OpenAI call failed: {e}")
+            logger.error("Simple OpenAI call failed: %s", e)
             raise
 
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed a single text (used for semantic response caching).
+        Returns None on failure so callers can fall back to a normal completion.
+        """
+        try:
+            client = await self._get_client()
+            response = await client.embeddings.create(
+                model=settings.embedding_model,
+                input=text
+            )
+            return response.data[0].embedding
+        except Exception as e:
+            logger.warning("Embedding call failed: %s", e)
+            return None
+
 # Create global instance
 openai_service = OpenAIService()
\ No newline at end of file
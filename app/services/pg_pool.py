@@ -0,0 +1,107 @@
+import logging
+from typing import Optional
+from urllib.parse import urlsplit
+
+import orjson
+
+# asyncpg is optional - without it (or without SUPABASE_DB_URL) the services use Supabase REST
+try:
+    import asyncpg
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    ASYNCPG_AVAILABLE = False
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Supabase's transaction-mode pooler (Supavisor/pgbouncer); session mode is on 5432
+_TRANSACTION_POOLER_PORT = 6543
+
+def _uses_transaction_pooler(dsn: str) -> bool:
+    try:
+        return urlsplit(dsn).port == _TRANSACTION_POOLER_PORT
+    except ValueError:
+        return False
+
+class PgPool:
+    """
+    Process-wide asyncpg connection pool for the hot chat-path queries.
+    Created once at app startup (see main.py lifespan) and shared by every request.
+    """
+
+    def __init__(self):
+        self.pool: Optional["asyncpg.Pool"] = None
+
+    @property
+    def available(self) -> bool:
+        return self.pool is not None
+
+    async def startup(self) -> None:
+        """Open the pool (min == max, so every connection is preallocated)"""
+        if self.pool is not None:
+            return
+
+        if not settings.database_url:
+            logger.info("SUPABASE_DB_URL not set - using Supabase REST for all queries")
+            return
+
+        if not ASYNCPG_AVAILABLE:
+            logger.error("asyncpg not installed - using Supabase REST for all queries")
+            return
+
+        statement_cache_size = settings.db_statement_cache_size
+        if statement_cache_size and _uses_transaction_pooler(settings.database_url):
+            # Named prepared statements don't survive a transaction-mode pooler handing
+            # the next transaction to another server connection
+            logger.warning("SUPABASE_DB_URL uses the transaction pooler - disabling the prepared statement cache")
+            statement_cache_size = 0
+
+        try:
+            self.pool = await asyncpg.create_pool(
+                dsn=settings.database_url,
+                min_size=settings.db_pool_size,
+                max_size=settings.db_pool_size,
+                statement_cache_size=statement_cache_size,
+                init=self._init_connection
+            )
+            logger.info("Postgres pool initialized (%d connections)", settings.db_pool_size)
+        except Exception as e:
+            logger.error("Failed to create Postgres pool: %s", e)
+            self.pool = None
+
+    async def shutdown(self) -> None:
+        """Close all pooled connections"""
+        if self.pool is not None:
+            await self.pool.close()
+        self.pool = None
+
+    @staticmethod
+    async def _init_connection(conn) -> None:
+        # Decode/encode JSON columns to Python objects, same as the REST client returns.
+        # Binary format lets orjson's bytes go on the wire as-is (jsonb adds a version byte).
+        await conn.set_type_codec(
+            "json",
+            encoder=orjson.dumps,
+            decoder=orjson.loads,
+            schema="pg_catalog",
+            format="binary"
+        )
+        await conn.set_type_codec(
+            "jsonb",
+            encoder=_encode_jsonb,
+            decoder=_decode_jsonb,
+            schema="pg_catalog",
+            format="binary"
+        )
+
+_JSONB_VERSION = b"\x01"
+
+def _encode_jsonb(value) -> bytes:
+    return _JSONB_VERSION + orjson.dumps(value)
+
+def _decode_jsonb(data: bytes):
+    return orjson.loads(memoryview(data)[1:])
+
+# Create global instance
+pg_pool = PgPool()
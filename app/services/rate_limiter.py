@@ -0,0 +1,59 @@
+import logging
+
+from cachetools import TTLCache
+
+from app.config.settings import settings
+from app.services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# INCR and start the window on the first hit, atomically
+_INCR_WITH_EXPIRE = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+class RateLimiter:
+    """
+    Fixed-window request counter per (phone_number, clinic_id).
+
+    Uses the response cache's Redis pool so limits are shared between workers;
+    without Redis it counts in-process. Redis errors fail open.
+    """
+
+    KEY_PREFIX = "rate_limit:"
+
+    def __init__(self):
+        self.max_requests = settings.rate_limit_requests
+        self.window = settings.rate_limit_window
+        self._script = None
+        # key -> [count]; the entry expires one window after the first request
+        self._local: TTLCache = TTLCache(maxsize=100_000, ttl=self.window)
+
+    async def hit(self, phone_number: str, clinic_id: str) -> bool:
+        """Count a request and return True if it is within the limit"""
+        key = f"{self.KEY_PREFIX}{phone_number}:{clinic_id}"
+
+        redis = cache_service.redis
+        if redis is not None:
+            try:
+                if self._script is None:
+                    self._script = redis.register_script(_INCR_WITH_EXPIRE)
+                count = await self._script(keys=[key], args=[self.window])
+                return int(count) <= self.max_requests
+            except Exception as e:
+                logger.warning("Redis rate limit check failed: %s", e)
+                return True
+
+        counter = self._local.get(key)
+        if counter is None:
+            self._local[key] = [1]
+            return True
+        counter[0] += 1
+        return counter[0] <= self.max_requests
+
+# Create global instance
+rate_limiter = RateLimiter()
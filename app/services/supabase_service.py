@@ -1,10 +1,62 @@
 import os
+import asyncio
 import json
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+import logging
+import orjson
+from typing import Dict, List, Optional, Any, Tuple, Union
+from datetime import datetime, timedelta, timezone
 import uuid
-from supabase import create_client, Client
+from collections import deque
+import httpx
+from cachetools import TTLCache
+from supabase import create_client, Client, ClientOptions
+from postgrest import ReturnMethod
 from app.config.settings import settings
+from app.services.pg_pool import pg_pool
+from app.services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Clinic rows change on the order of days; keep recently used clinics in memory
+_clinic_cache: TTLCache = TTLCache(maxsize=settings.clinic_cache_max_entries, ttl=settings.clinic_cache_ttl)
+# clinics.clinic_id -> clinics.id (uuid, as text), so per-message writes don't look the clinic up again
+_clinic_uuid_cache: TTLCache = TTLCache(maxsize=settings.clinic_cache_max_entries, ttl=settings.clinic_cache_ttl)
+# One in-flight lookup per clinic_id; concurrent callers wait for it instead of querying too
+_clinic_uuid_locks: Dict[str, asyncio.Lock] = {}
+# session_id -> deque of (created_at, message) for the session's recent history, oldest first
+_history_cache: TTLCache = TTLCache(maxsize=settings.history_cache_max_entries, ttl=settings.history_cache_ttl)
+
+class _OrjsonHttpClient(httpx.Client):
+    """
+    httpx client for supabase-py that encodes request bodies and decodes responses with
+    orjson (PostgREST payloads such as chat history rows are mostly JSON parsing)
+    """
+
+    def build_request(self, method, url, *, content=None, json=None, headers=None, **kwargs):
+        if json is not None and content is None:
+            content = orjson.dumps(json)
+            headers = httpx.Headers(headers)
+            headers["Content-Type"] = "application/json"
+            json = None
+        return super().build_request(method, url, content=content, json=json, headers=headers, **kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        response.json = lambda **_: _loads_response(response)
+        return response
+
+def _loads_response(response: httpx.Response):
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        # e.g. lone surrogate escapes, which the stdlib parser accepts
+        return json.loads(response.content)
+
+def _as_datetime(value: Union[str, datetime]) -> datetime:
+    """created_at as an aware datetime (asyncpg returns datetimes, PostgREST ISO strings)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
 
 class SupabaseService:
     def __init__(self):
@@ -14,224 +66,729 @@ class SupabaseService:
         if not url or not key:
             raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in environment variables")
         
-        self.supabase: Client = create_client(url, key)
-        print("✅ Supabase client initialized")
+        # One keep-alive HTTP/2 pool for every PostgREST call. REST calls run on worker
+        # threads, so it is sized above the default executor (THREAD_POOL_WORKERS).
+        self.http_client = _OrjsonHttpClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=settings.supabase_http_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.supabase_max_connections,
+                max_keepalive_connections=settings.supabase_max_keepalive_connections
+            )
+        )
+        self.supabase: Client = create_client(url, key, options=ClientOptions(httpx_client=self.http_client))
+        logger.info("Supabase client initialized")
+
+        # session_id -> time of its latest message, written to chat_sessions by the periodic flush
+        self._pending_touches: Dict[str, datetime] = {}
+        self._touch_task: Optional[asyncio.Task] = None
+        # (rows, future) per saved turn, waiting for the message writer
+        self._message_queue: List[Tuple[List[Dict[str, Any]], asyncio.Future]] = []
+        self._message_writer: Optional[asyncio.Task] = None
+
+    async def startup(self) -> None:
+        """Start the background writer for coalesced session timestamps"""
+        if self._touch_task is None:
+            self._touch_task = asyncio.create_task(self._flush_session_touches_forever())
+
+    async def shutdown(self) -> None:
+        """Finish queued message inserts, write outstanding session timestamps and close the shared HTTP connection pool"""
+        if self._touch_task is not None:
+            self._touch_task.cancel()
+            try:
+                await self._touch_task
+            except asyncio.CancelledError:
+                pass
+            self._touch_task = None
+        if self._message_writer is not None:
+            await asyncio.gather(self._message_writer, return_exceptions=True)
+        await self._flush_session_touches()
+        self.http_client.close()
+
+    async def _touch_session(self, session_id: str) -> None:
+        """
+        Record activity on a session. Touches are coalesced per session and written by the
+        periodic flush; without it (no app lifespan) the update is written right away.
+        """
+        touched_at = datetime.now(timezone.utc)
+        if self._touch_task is None:
+            await self._write_session_touches({session_id: touched_at})
+            return
+        self._pending_touches[session_id] = touched_at
+
+    async def _flush_session_touches_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.session_touch_interval)
+            await self._flush_session_touches()
+
+    async def _flush_session_touches(self) -> None:
+        if not self._pending_touches:
+            return
+        
+        touches, self._pending_touches = self._pending_touches, {}
+        try:
+            await self._write_session_touches(touches)
+        except Exception as e:
+            logger.error("Error updating session timestamps: %s", e)
+            # Retry on the next flush, unless the session has been touched again since
+            for session_id, touched_at in touches.items():
+                self._pending_touches.setdefault(session_id, touched_at)
+
+    async def _write_session_touches(self, touches: Dict[str, datetime]) -> None:
+        if pg_pool.available:
+            await pg_pool.pool.execute(
+                """
+                UPDATE chat_sessions s SET last_message_at = t.touched_at
+                FROM unnest($1::uuid[], $2::timestamptz[]) AS t(id, touched_at)
+                WHERE s.id = t.id
+                """,
+                list(touches), list(touches.values())
+            )
+            return
+        
+        # PostgREST can't set a different value per row; the batch shares its latest timestamp
+        await asyncio.to_thread(
+            self.supabase.table('chat_sessions').update({
+                'last_message_at': max(touches.values()).isoformat()
+            }, returning=ReturnMethod.minimal).in_('id', list(touches)).execute
+        )
 
     async def get_clinic_data(self, clinic_id: str) -> Optional[Dict[str, Any]]:
         """
         Fetch clinic data including doctors and services from Supabase
         Returns data in the same format as the original clinic_data.json
+        Results are served from an in-process TTL cache, then from Redis, when available.
         """
+        cached = _clinic_cache.get(clinic_id)
+        if cached is not None:
+            return cached
+
+        cached = await self._get_shared_clinic_data(clinic_id)
+        if cached is not None:
+            _clinic_cache[clinic_id] = cached
+            return cached
+
         try:
-            # Get clinic information
-            clinic_response = self.supabase.table('clinics').select('*').eq('clinic_id', clinic_id).execute()
-            
-            if not clinic_response.data:
-                print(f"❌ Clinic not found: {clinic_id}")
+            try:
+                clinic_uuid, clinic_data = await self._fetch_clinic_catalog(clinic_id)
+            except Exception as e:
+                logger.warning("clinic_catalog_mv read failed, building clinic data from tables: %s", e)
+                clinic_uuid, clinic_data = await self._build_clinic_data(clinic_id)
+            
+            if clinic_data is None:
+                logger.warning("Clinic not found: %s", clinic_id)
                 return None
             
-            clinic = clinic_response.data[0]
-            
-            # Get doctors for this clinic
-            doctors_response = self.supabase.table('doctors').select('*').eq('clinic_id', clinic['id']).execute()
-            
-            # Transform to match original format
-            clinic_data = {
-                "clinic_id": clinic['clinic_id'],
-                "clinic_name": clinic['clinic_name'],
-                "whatsapp_contact": clinic['whatsapp_contact'],
-                "phone": clinic['phone'],
-                "address": clinic['address'],
-                "timezone": clinic['timezone'],
-                "config": clinic.get('config', {}),
-                "Doctors": []
+            _clinic_cache[clinic_id] = clinic_data
+            _clinic_uuid_cache[clinic_id] = clinic_uuid
+            await self._set_shared_clinic_data(clinic_id, clinic_data)
+            logger.info("Loaded clinic data for: %s", clinic_data['clinic_name'])
+            return clinic_data
+            
+        except Exception as e:
+            logger.error("Error fetching clinic data: %s", e)
+            return None
+
+    async def _fetch_clinic_catalog(self, clinic_id: str):
+        """(clinic uuid, clinic_data) prebuilt by the clinic_catalog_mv view (see supabase_setup.py)"""
+        if pg_pool.available:
+            row = await pg_pool.pool.fetchrow(
+                "SELECT id::text AS id, payload FROM clinic_catalog_mv WHERE clinic_id = $1",
+                clinic_id
+            )
+        else:
+            response = await asyncio.to_thread(
+                self.supabase.table('clinic_catalog_mv').select('id, payload').eq('clinic_id', clinic_id).maybe_single().execute
+            )
+            row = response.data if response is not None else None
+        
+        if row is None:
+            return None, None
+        return str(row['id']), row['payload']
+
+    async def _build_clinic_data(self, clinic_id: str):
+        """(clinic uuid, clinic_data) assembled from the clinics and doctors tables"""
+        if pg_pool.available:
+            clinic, doctors = await self._fetch_clinic_rows_pg(clinic_id)
+        else:
+            clinic, doctors = await self._fetch_clinic_rows_rest(clinic_id)
+        
+        if clinic is None:
+            return None, None
+        
+        # Transform to match original format
+        clinic_data = {
+            "clinic_id": clinic['clinic_id'],
+            "clinic_name": clinic['clinic_name'],
+            "whatsapp_contact": clinic['whatsapp_contact'],
+            "phone": clinic['phone'],
+            "address": clinic['address'],
+            "timezone": clinic['timezone'],
+            "config": clinic.get('config', {}),
+            "updated_at": clinic.get('updated_at'),
+            "Doctors": []
+        }
+        
+        # Transform doctors data
+        for doctor in doctors:
+            doctor_data = {
+                "Name": doctor['name'],
+                "Speciality": doctor['speciality'],
+                "Calendar_email": doctor['calendar_email'],
+                "Timings": doctor['timings'],
+                "Services": doctor.get('services', {})
             }
+            clinic_data["Doctors"].append(doctor_data)
+
+            # The clinic's version is the latest change to the clinic or any of its doctors
+            if doctor.get('updated_at') and (not clinic_data["updated_at"] or doctor['updated_at'] > clinic_data["updated_at"]):
+                clinic_data["updated_at"] = doctor['updated_at']
+        
+        return str(clinic['id']), clinic_data
+
+    # Columns read by _build_clinic_data (same as the Postgres path below)
+    CLINIC_COLUMNS = 'id, clinic_id, clinic_name, whatsapp_contact, phone, address, timezone, config, updated_at'
+    DOCTOR_COLUMNS = 'name, speciality, calendar_email, timings, services, updated_at'
+
+    async def _fetch_clinic_rows_rest(self, clinic_id: str):
+        # Doctors are embedded through the doctors.clinic_id foreign key - one request
+        clinic_response = await asyncio.to_thread(
+            self.supabase.table('clinics').select(
+                f"{self.CLINIC_COLUMNS}, doctors({self.DOCTOR_COLUMNS})"
+            ).eq('clinic_id', clinic_id).maybe_single().execute
+        )
+        if clinic_response is None:
+            return None, []
+        
+        clinic = clinic_response.data
+        return clinic, clinic.pop('doctors') or []
+
+    async def _fetch_clinic_rows_pg(self, clinic_id: str):
+        async with pg_pool.pool.acquire() as conn:
+            clinic = await conn.fetchrow(
+                """
+                SELECT id, clinic_id, clinic_name, whatsapp_contact, phone, address, timezone,
+                       config, updated_at::text AS updated_at
+                FROM clinics WHERE clinic_id = $1
+                """,
+                clinic_id
+            )
+            if clinic is None:
+                return None, []
+            
+            doctors = await conn.fetch(
+                """
+                SELECT name, speciality, calendar_email, timings, services, updated_at::text AS updated_at
+                FROM doctors WHERE clinic_id = $1
+                """,
+                clinic['id']
+            )
+        return dict(clinic), [dict(doctor) for doctor in doctors]
+
+    CLINIC_METADATA_COLUMNS = 'clinic_id, clinic_name, timezone, address, phone'
+
+    async def get_clinic_metadata(self, clinic_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch only the clinic's descriptive columns (no doctors, no config JSON).
+        Use this for endpoints that don't need the full clinic_data.
+        """
+        cached = _clinic_cache.get(clinic_id)
+        if cached is not None:
+            return {column: cached.get(column) for column in self.CLINIC_METADATA_COLUMNS.split(', ')}
+
+        try:
+            clinic_response = await asyncio.to_thread(
+                self.supabase.table('clinics').select(self.CLINIC_METADATA_COLUMNS).eq('clinic_id', clinic_id).maybe_single().execute
+            )
             
-            # Transform doctors data
-            for doctor in doctors_response.data:
-                doctor_data = {
-                    "Name": doctor['name'],
-                    "Speciality": doctor['speciality'],
-                    "Calendar_email": doctor['calendar_email'],
-                    "Timings": doctor['timings'],
-                    "Services": doctor.get('services', {})
-                }
-                clinic_data["Doctors"].append(doctor_data)
+            if clinic_response is None:
+                logger.warning("Clinic not found: %s", clinic_id)
+                return None
             
-            print(f"✅ Loaded clinic data for: {clinic['clinic_name']}")
-            return clinic_data
+            return clinic_response.data
             
         except Exception as e:
-            print(f"❌ Error fetching clinic data: {e}")
+            logger.error("Error fetching clinic metadata: %s", e)
+            return None
+
+    async def list_clinic_metadata(self) -> List[Dict[str, Any]]:
+        """List all clinics with their descriptive columns only"""
+        clinics_response = await asyncio.to_thread(
+            self.supabase.table('clinics').select(self.CLINIC_METADATA_COLUMNS).execute
+        )
+        return clinics_response.data
+
+    async def invalidate_clinic_cache(self, clinic_id: str) -> None:
+        """
+        Drop a clinic from this process's cache and from Redis (call after admin changes).
+        Other workers keep their in-process copy until it expires (CLINIC_CACHE_TTL).
+        """
+        _clinic_cache.pop(clinic_id, None)
+        _clinic_uuid_cache.pop(clinic_id, None)
+        
+        if cache_service.redis is not None:
+            try:
+                await cache_service.redis.delete(self.CLINIC_REDIS_PREFIX + clinic_id)
+            except Exception as e:
+                logger.warning("Redis clinic cache delete failed: %s", e)
+
+    CLINIC_REDIS_PREFIX = "clinic_data:"
+
+    async def _get_shared_clinic_data(self, clinic_id: str) -> Optional[Dict[str, Any]]:
+        if cache_service.redis is None:
+            return None
+        try:
+            cached = await cache_service.redis.get(self.CLINIC_REDIS_PREFIX + clinic_id)
+        except Exception as e:
+            logger.warning("Redis clinic cache read failed: %s", e)
             return None
+        return orjson.loads(cached) if cached is not None else None
+
+    async def _set_shared_clinic_data(self, clinic_id: str, clinic_data: Dict[str, Any]) -> None:
+        if cache_service.redis is None:
+            return
+        try:
+            await cache_service.redis.set(
+                self.CLINIC_REDIS_PREFIX + clinic_id,
+                orjson.dumps(clinic_data, default=str),
+                ex=settings.clinic_redis_cache_ttl
+            )
+        except Exception as e:
+            logger.warning("Redis clinic cache write failed: %s", e)
+
+    async def _resolve_clinic_uuid(self, clinic_id: str) -> Optional[str]:
+        """clinics.id for a clinic_id, or None if the clinic doesn't exist"""
+        clinic_uuid = _clinic_uuid_cache.get(clinic_id)
+        if clinic_uuid is not None:
+            return clinic_uuid
+        
+        lock = _clinic_uuid_locks.setdefault(clinic_id, asyncio.Lock())
+        async with lock:
+            clinic_uuid = _clinic_uuid_cache.get(clinic_id)
+            if clinic_uuid is None:
+                clinic_uuid = await self._fetch_clinic_uuid(clinic_id)
+                if clinic_uuid is not None:
+                    _clinic_uuid_cache[clinic_id] = clinic_uuid
+        if _clinic_uuid_locks.get(clinic_id) is lock:
+            del _clinic_uuid_locks[clinic_id]
+        return clinic_uuid
+
+    async def _fetch_clinic_uuid(self, clinic_id: str) -> Optional[str]:
+        if pg_pool.available:
+            return await pg_pool.pool.fetchval("SELECT id::text FROM clinics WHERE clinic_id = $1", clinic_id)
+        
+        clinic_response = await asyncio.to_thread(
+            self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).maybe_single().execute
+        )
+        return clinic_response.data['id'] if clinic_response is not None else None
+
+    USER_COLUMNS = 'id, phone_number, clinic_id, name, last_active, created_at'
 
     async def get_or_create_user(self, phone_number: str, clinic_id: str, name: str = None) -> Optional[Dict[str, Any]]:
         """
         Get existing user or create new one
         """
         try:
-            # First get the clinic UUID
-            clinic_response = self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).execute()
+            if pg_pool.available:
+                return await self._upsert_user_pg(phone_number, clinic_id, name)
             
-            if not clinic_response.data:
-                print(f"❌ Clinic not found: {clinic_id}")
+            # First get the clinic UUID
+            clinic_uuid = await self._resolve_clinic_uuid(clinic_id)
+            if clinic_uuid is None:
+                logger.warning("Clinic not found: %s", clinic_id)
                 return None
             
-            clinic_uuid = clinic_response.data[0]['id']
-            
             # Check if user exists
-            user_response = self.supabase.table('users').select('*').eq('phone_number', phone_number).eq('clinic_id', clinic_uuid).execute()
+            user_response = await asyncio.to_thread(
+                self.supabase.table('users').select(self.USER_COLUMNS).eq('phone_number', phone_number).eq('clinic_id', clinic_uuid).maybe_single().execute
+            )
             
-            if user_response.data:
+            if user_response is not None:
                 # Update last_active
-                user = user_response.data[0]
-                self.supabase.table('users').update({
-                    'last_active': datetime.now().isoformat(),
-                    'name': name or user.get('name')
-                }).eq('id', user['id']).execute()
+                user = user_response.data
+                await asyncio.to_thread(
+                    self.supabase.table('users').update({
+                        'last_active': datetime.now(timezone.utc).isoformat(),
+                        'name': name or user.get('name')
+                    }, returning=ReturnMethod.minimal).eq('id', user['id']).execute
+                )
                 
-                print(f"✅ Found existing user: {phone_number}")
+                logger.debug("Found existing user: %s", phone_number)
                 return user
             else:
-                # Create new user
+                # Create new user (last_active defaults to the database's now())
                 new_user = {
                     'phone_number': phone_number,
                     'clinic_id': clinic_uuid,
-                    'name': name,
-                    'last_active': datetime.now().isoformat()
+                    'name': name
                 }
                 
-                user_response = self.supabase.table('users').insert(new_user).execute()
-                print(f"✅ Created new user: {phone_number}")
+                user_response = await asyncio.to_thread(self.supabase.table('users').insert(new_user).execute)
+                logger.debug("Created new user: %s", phone_number)
                 return user_response.data[0]
                 
         except Exception as e:
-            print(f"❌ Error managing user: {e}")
+            logger.error("Error managing user: %s", e)
             return None
 
+    async def _upsert_user_pg(self, phone_number: str, clinic_id: str, name: str = None) -> Optional[Dict[str, Any]]:
+        user = await pg_pool.pool.fetchrow(
+            """
+            INSERT INTO users (phone_number, clinic_id, name, last_active)
+            SELECT $1, c.id, $3, CURRENT_TIMESTAMP FROM clinics c WHERE c.clinic_id = $2
+            ON CONFLICT (phone_number, clinic_id) DO UPDATE
+                SET last_active = EXCLUDED.last_active,
+                    name = COALESCE(EXCLUDED.name, users.name)
+            RETURNING id::text AS id, phone_number, clinic_id::text AS clinic_id, name,
+                      last_active::text AS last_active, created_at::text AS created_at
+            """,
+            phone_number, clinic_id, name
+        )
+        if user is None:
+            logger.warning("Clinic not found: %s", clinic_id)
+            return None
+        
+        return dict(user)
+
+    SESSION_COLUMNS = 'id, user_id, clinic_id, last_message_at, created_at'
+
     async def get_chat_session(self, user_id: str, clinic_id: str) -> Optional[Dict[str, Any]]:
         """
         Get the latest chat session for a user or create a new one
         Modified to preserve context indefinitely (no session timeout)
         """
         try:
-            clinic_response = self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).execute()
+            if pg_pool.available:
+                return await self._get_chat_session_pg(user_id, clinic_id)
             
-            if not clinic_response.data:
+            clinic_uuid = await self._resolve_clinic_uuid(clinic_id)
+            if clinic_uuid is None:
                 return None
             
-            clinic_uuid = clinic_response.data[0]['id']
-            
             # Get the most recent session
-            session_response = self.supabase.table('chat_sessions').select('*').eq('user_id', user_id).eq('clinic_id', clinic_uuid).order('last_message_at', desc=True).limit(1).execute()
+            session_response = await asyncio.to_thread(
+                self.supabase.table('chat_sessions').select(self.SESSION_COLUMNS).eq('user_id', user_id).eq('clinic_id', clinic_uuid).order('last_message_at', desc=True).limit(1).maybe_single().execute
+            )
             
-            if session_response.data:
-                session = session_response.data[0]
+            if session_response is not None:
+                session = session_response.data
                 
                 # REMOVED: Session timeout check - always use existing session
                 # This preserves chat history indefinitely
-                print(f"✅ Using existing session: {session['id']}")
+                logger.debug("Using existing session: %s", session['id'])
                 return session
             
             # Create new session if no session exists (KEEP THIS!)
-            # This is essential for new users
+            # This is essential for new users (last_message_at defaults to the database's now())
             new_session = {
                 'user_id': user_id,
-                'clinic_id': clinic_uuid,
-                'session_data': [],
-                'last_message_at': datetime.now().isoformat()
+                'clinic_id': clinic_uuid
             }
             
-            session_response = self.supabase.table('chat_sessions').insert(new_session).execute()
-            print(f"✅ Created new chat session")
+            session_response = await asyncio.to_thread(self.supabase.table('chat_sessions').insert(new_session).execute)
+            logger.debug("Created new chat session")
             return session_response.data[0]
             
         except Exception as e:
-            print(f"❌ Error managing chat session: {e}")
+            logger.error("Error managing chat session: %s", e)
             return None
         
-    async def save_message(self, session_id: str, user_id: str, clinic_id: str, role: str, content: str, tool_calls: List[Dict] = None, tool_call_id: str = None, function_name: str = None) -> bool:
+    async def ensure_user_and_session(self, phone_number: str, clinic_id: str, name: str = None) -> Optional[Dict[str, str]]:
         """
-        Save a message to the database
+        Get or create the user and their latest chat session in a single round-trip
+        (ensure_user_and_session SQL function, see supabase_setup.py).
+        Returns {'user_id': ..., 'session_id': ...} or None if the clinic doesn't exist.
         """
         try:
-            clinic_response = self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).execute()
+            if pg_pool.available:
+                row = await pg_pool.pool.fetchrow(
+                    "SELECT user_id::text AS user_id, session_id::text AS session_id FROM ensure_user_and_session($1, $2, $3)",
+                    phone_number, clinic_id, name
+                )
+                return dict(row) if row else None
+            
+            response = await asyncio.to_thread(
+                self.supabase.rpc('ensure_user_and_session', {
+                    'p_phone': phone_number,
+                    'p_clinic': clinic_id,
+                    'p_name': name
+                }).execute
+            )
+            return response.data[0] if response.data else None
             
-            if not clinic_response.data:
+        except Exception as e:
+            logger.warning("ensure_user_and_session failed, falling back to separate lookups: %s", e)
+        
+        user = await self.get_or_create_user(phone_number, clinic_id, name)
+        if not user:
+            return None
+        
+        session = await self.get_chat_session(user['id'], clinic_id)
+        if not session:
+            return None
+        
+        return {'user_id': user['id'], 'session_id': session['id']}
+
+    _SESSION_COLUMNS_SQL = """
+        s.id::text AS id, s.user_id::text AS user_id, s.clinic_id::text AS clinic_id,
+        s.last_message_at::text AS last_message_at, s.created_at::text AS created_at
+    """
+
+    async def _get_chat_session_pg(self, user_id: str, clinic_id: str) -> Optional[Dict[str, Any]]:
+        async with pg_pool.pool.acquire() as conn:
+            session = await conn.fetchrow(
+                f"""
+                SELECT {self._SESSION_COLUMNS_SQL}
+                FROM chat_sessions s JOIN clinics c ON c.id = s.clinic_id
+                WHERE s.user_id = $1::uuid AND c.clinic_id = $2
+                ORDER BY s.last_message_at DESC LIMIT 1
+                """,
+                user_id, clinic_id
+            )
+            if session is not None:
+                logger.debug("Using existing session: %s", session['id'])
+                return dict(session)
+            
+            session = await conn.fetchrow(
+                f"""
+                INSERT INTO chat_sessions AS s (user_id, clinic_id)
+                SELECT $1::uuid, c.id FROM clinics c WHERE c.clinic_id = $2
+                RETURNING {self._SESSION_COLUMNS_SQL}
+                """,
+                user_id, clinic_id
+            )
+        if session is None:
+            return None
+        
+        logger.debug("Created new chat session")
+        return dict(session)
+
+    @staticmethod
+    def _content_columns(content: Union[str, List, Dict, None]) -> Dict[str, Any]:
+        """
+        Structured content (e.g. tool results) goes to the JSONB content_json column as-is,
+        text goes to content - avoids serializing JSON into a string for Postgres to re-parse
+        """
+        if isinstance(content, (list, dict)):
+            return {'content': None, 'content_json': content}
+        return {'content': content, 'content_json': None}
+
+    async def save_message(self, session_id: str, user_id: str, clinic_id: str, role: str, content: Union[str, List, Dict], tool_calls: List[Dict] = None, tool_call_id: str = None, function_name: str = None) -> bool:
+        """
+        Save a message to the database
+        """
+        message = {
+            'role': role,
+            'content': content,
+            'tool_calls': tool_calls,
+            'tool_call_id': tool_call_id,
+            'function_name': function_name
+        }
+        
+        if not pg_pool.available:
+            # Insert and session touch in one round-trip (save_message_and_touch_session, see supabase_setup.py)
+            try:
+                columns = self._content_columns(content)
+                response = await asyncio.to_thread(self.supabase.rpc('save_message_and_touch_session', {
+                    'p_session': session_id,
+                    'p_user': user_id,
+                    'p_clinic_code': clinic_id,
+                    'p_role': role,
+                    'p_content': columns['content'],
+                    'p_content_json': columns['content_json'],
+                    'p_tool_calls': tool_calls,
+                    'p_tool_call_id': tool_call_id,
+                    'p_fn_name': function_name
+                }).execute)
+                return bool(response.data)
+            except Exception as e:
+                logger.warning("save_message_and_touch_session failed, falling back to separate writes: %s", e)
+        
+        return await self.save_messages_bulk(session_id, user_id, clinic_id, [message])
+
+    async def save_messages_bulk(self, session_id: str, user_id: str, clinic_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """
+        Save all messages of a chat turn and touch the session.
+        Each message carries its own created_at so ordering within the turn is preserved;
+        turns saved while another insert is in flight are written together in the next one.
+        """
+        if not messages:
+            return True
+
+        try:
+            clinic_uuid = await self._resolve_clinic_uuid(clinic_id)
+            if clinic_uuid is None:
                 return False
             
-            clinic_uuid = clinic_response.data[0]['id']
-            
-            message_data = {
-                'session_id': session_id,
-                'user_id': user_id,
-                'clinic_id': clinic_uuid,
-                'role': role,
-                'content': content,
-                'tool_calls': tool_calls,
-                'tool_call_id': tool_call_id,
-                'function_name': function_name
-            }
+            rows = [
+                {
+                    'session_id': session_id,
+                    'user_id': user_id,
+                    'clinic_id': clinic_uuid,
+                    'role': message['role'],
+                    **self._content_columns(message.get('content')),
+                    'tool_calls': message.get('tool_calls'),
+                    'tool_call_id': message.get('tool_call_id'),
+                    'function_name': message.get('function_name'),
+                    'created_at': message.get('created_at')
+                }
+                for message in messages
+            ]
             
-            self.supabase.table('chat_messages').insert(message_data).execute()
+            written = asyncio.get_running_loop().create_future()
+            self._message_queue.append((rows, written))
+            if self._message_writer is None or self._message_writer.done():
+                self._message_writer = asyncio.create_task(self._write_queued_messages())
+            await written
             
             # Update session's last_message_at
-            self.supabase.table('chat_sessions').update({
-                'last_message_at': datetime.now().isoformat()
-            }).eq('id', session_id).execute()
+            await self._touch_session(session_id)
             
             return True
             
         except Exception as e:
-            print(f"❌ Error saving message: {e}")
+            logger.error("Error saving messages: %s", e)
             return False
 
-    async def get_chat_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    async def _write_queued_messages(self) -> None:
+        """Group commit: write everything queued so far in one insert, until the queue is empty"""
+        while self._message_queue:
+            batch, self._message_queue = self._message_queue, []
+            try:
+                await self._insert_message_rows([row for rows, _ in batch for row in rows])
+                results = [None] * len(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [e]
+                else:
+                    # Write turn by turn so one bad row only fails its own turn
+                    results = []
+                    for rows, _ in batch:
+                        try:
+                            await self._insert_message_rows(rows)
+                            results.append(None)
+                        except Exception as turn_error:
+                            results.append(turn_error)
+            
+            for (_, written), error in zip(batch, results):
+                if written.done():
+                    continue
+                if error is None:
+                    written.set_result(None)
+                else:
+                    written.set_exception(error)
+
+    async def _insert_message_rows(self, rows: List[Dict[str, Any]]) -> None:
+        if pg_pool.available:
+            async with pg_pool.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(
+                        """
+                        INSERT INTO chat_messages (session_id, user_id, clinic_id, role, content, content_json,
+                                                   tool_calls, tool_call_id, function_name, created_at)
+                        VALUES ($1::uuid, $2::uuid, $3::uuid, $4, $5, $6, $7, $8, $9,
+                                COALESCE($10::text::timestamptz, CURRENT_TIMESTAMP))
+                        """,
+                        # Rows are built in column order
+                        [tuple(row.values()) for row in rows]
+                    )
+            return
+        
+        # PostgREST sends NULL rather than the column default for keys missing from a row
+        now = datetime.now(timezone.utc).isoformat()
+        for row in rows:
+            row['created_at'] = row['created_at'] or now
+        await asyncio.to_thread(self.supabase.table('chat_messages').insert(rows, returning=ReturnMethod.minimal).execute)
+
+    HISTORY_COLUMNS = 'role, content, content_json, tool_calls, tool_call_id, function_name, created_at'
+
+    async def get_chat_history(self, session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """
-        Get chat history for a session
+        Get the most recent `limit` messages of a session, oldest first.
+        Sessions seen recently are served from memory plus the rows of their latest stretch.
         """
         try:
-            messages_response = self.supabase.table('chat_messages').select('*').eq('session_id', session_id).order('created_at', desc=False).limit(limit).execute()
-            
-            chat_history = []
-            for msg in messages_response.data:
-                message = {
-                    "role": msg['role'],
-                    "content": msg['content']
-                }
-                
-                if msg['tool_calls']:
-                    message["tool_calls"] = msg['tool_calls']
-                
-                if msg['tool_call_id']:
-                    message["tool_call_id"] = msg['tool_call_id']
-                    message["name"] = msg['function_name']
-                
-                chat_history.append(message)
-            
-            print(f"✅ Loaded {len(chat_history)} messages from history")
+            entry = _history_cache.get(session_id)
+            if entry is None or entry.maxlen < limit:
+                entry = deque(maxlen=limit)
+            
+            # Messages are stamped when produced but written at the end of their turn, so an
+            # overlapping turn (e.g. on another worker) can commit rows older than the newest
+            # cached one: re-read a window behind it and replace that tail rather than append
+            after = entry[-1][0] - timedelta(seconds=settings.history_cache_overlap) if entry else None
+            rows = await self._fetch_history_rows(session_id, limit, after)
+            while entry and entry[-1][0] > after:
+                entry.pop()
+            for msg in reversed(rows):
+                entry.append((_as_datetime(msg['created_at']), self._history_message(msg)))
+            _history_cache[session_id] = entry
+            
+            chat_history = [message for _, message in entry][-limit:]
+            logger.debug("Loaded %d messages from history (%d from database)", len(chat_history), len(rows))
             return chat_history
             
         except Exception as e:
-            print(f"❌ Error loading chat history: {e}")
+            logger.error("Error loading chat history: %s", e)
             return []
 
+    async def _fetch_history_rows(self, session_id: str, limit: int, after: Optional[datetime]) -> List[Dict[str, Any]]:
+        """Newest first: the last `limit` messages, or only those created after `after`"""
+        if pg_pool.available:
+            return await pg_pool.pool.fetch(
+                """
+                SELECT role, content, content_json, tool_calls, tool_call_id, function_name, created_at
+                FROM chat_messages
+                WHERE session_id = $1::uuid AND ($3::timestamptz IS NULL OR created_at > $3)
+                ORDER BY created_at DESC LIMIT $2
+                """,
+                session_id, limit, after
+            )
+        
+        query = self.supabase.table('chat_messages').select(self.HISTORY_COLUMNS).eq('session_id', session_id)
+        if after is not None:
+            query = query.gt('created_at', after.isoformat())
+        response = await asyncio.to_thread(query.order('created_at', desc=True).limit(limit).execute)
+        return response.data
+
+    @staticmethod
+    def _history_message(msg) -> Dict[str, Any]:
+        """A chat_messages row (or a message as saved) in OpenAI message format"""
+        content = msg['content']
+        if isinstance(content, (list, dict)):
+            content = orjson.dumps(content).decode()
+        elif content is None and msg.get('content_json') is not None:
+            content = orjson.dumps(msg['content_json']).decode()
+        
+        message = {
+            "role": msg['role'],
+            "content": content
+        }
+        
+        if msg.get('tool_calls'):
+            message["tool_calls"] = msg['tool_calls']
+        
+        if msg.get('tool_call_id'):
+            message["tool_call_id"] = msg['tool_call_id']
+            message["name"] = msg.get('function_name')
+        
+        return message
+
     async def save_appointment(self, user_id: str, clinic_id: str, appointment_details: Dict[str, Any]) -> bool:
         """
         Save appointment details to database
         """
         try:
-            clinic_response = self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).execute()
-            
-            if not clinic_response.data:
+            clinic_uuid = await self._resolve_clinic_uuid(clinic_id)
+            if clinic_uuid is None:
                 return False
             
-            clinic_uuid = clinic_response.data[0]['id']
-            
             # Find doctor
-            doctor_response = self.supabase.table('doctors').select('id').eq('clinic_id', clinic_uuid).eq('calendar_email', appointment_details.get('doctor_email')).execute()
+            doctor_response = await asyncio.to_thread(
+                self.supabase.table('doctors').select('id').eq('clinic_id', clinic_uuid).eq('calendar_email', appointment_details.get('doctor_email')).limit(1).maybe_single().execute
+            )
             
-            doctor_id = doctor_response.data[0]['id'] if doctor_response.data else None
+            doctor_id = doctor_response.data['id'] if doctor_response is not None else None
             
             appointment_data = {
                 'user_id': user_id,
@@ -247,12 +804,14 @@ class SupabaseService:
                 'status': 'confirmed'
             }
             
-            self.supabase.table('appointments').insert(appointment_data).execute()
-            print(f"✅ Appointment saved to database")
+            await asyncio.to_thread(
+                self.supabase.table('appointments').insert(appointment_data, returning=ReturnMethod.minimal).execute
+            )
+            logger.debug("Appointment saved to database")
             return True
             
         except Exception as e:
-            print(f"❌ Error saving appointment: {e}")
+            logger.error("Error saving appointment: %s", e)
             return False
 
     async def get_user_appointments(self, user_id: str, clinic_id: str, limit: int = 10) -> List[Dict[str, Any]]:
@@ -260,19 +819,18 @@ class SupabaseService:
         Get user's recent appointments
         """
         try:
-            clinic_response = self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).execute()
-            
-            if not clinic_response.data:
+            clinic_uuid = await self._resolve_clinic_uuid(clinic_id)
+            if clinic_uuid is None:
                 return []
             
-            clinic_uuid = clinic_response.data[0]['id']
-            
-            appointments_response = self.supabase.table('appointments').select('*, doctors(name)').eq('user_id', user_id).eq('clinic_id', clinic_uuid).order('appointment_datetime', desc=True).limit(limit).execute()
+            appointments_response = await asyncio.to_thread(
+                self.supabase.table('appointments').select('*, doctors(name)').eq('user_id', user_id).eq('clinic_id', clinic_uuid).order('appointment_datetime', desc=True).limit(limit).execute
+            )
             
             return appointments_response.data
             
         except Exception as e:
-            print(f"❌ Error fetching appointments: {e}")
+            logger.error("Error fetching appointments: %s", e)
             return []
 
     async def clear_user_chat_history(self, user_id: str, clinic_id: str) -> bool:
@@ -280,40 +838,25 @@ class SupabaseService:
         Clear chat history for a user (useful for testing or privacy)
         """
         try:
-            clinic_response = self.supabase.table('clinics').select('id').eq('clinic_id', clinic_id).execute()
-            
-            if not clinic_response.data:
+            clinic_uuid = await self._resolve_clinic_uuid(clinic_id)
+            if clinic_uuid is None:
                 return False
             
-            clinic_uuid = clinic_response.data[0]['id']
-            
             # Delete all chat messages for the user
-            self.supabase.table('chat_messages').delete().eq('user_id', user_id).eq('clinic_id', clinic_uuid).execute()
+            await asyncio.to_thread(
+                self.supabase.table('chat_messages').delete(returning=ReturnMethod.minimal).eq('user_id', user_id).eq('clinic_id', clinic_uuid).execute
+            )
             
             # Delete all chat sessions for the user
-            self.supabase.table('chat_sessions').delete().eq('user_id', user_id).eq('clinic_id', clinic_uuid).execute()
-            
-            print(f"✅ Cleared chat history for user: {user_id}")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error clearing chat history: {e}")
-            return False
-
-    async def update_session_data(self, session_id: str, session_data: List[Dict]) -> bool:
-        """
-        Update session data (backup method)
-        """
-        try:
-            self.supabase.table('chat_sessions').update({
-                'session_data': session_data,
-                'last_message_at': datetime.now().isoformat()
-            }).eq('id', session_id).execute()
+            await asyncio.to_thread(
+                self.supabase.table('chat_sessions').delete(returning=ReturnMethod.minimal).eq('user_id', user_id).eq('clinic_id', clinic_uuid).execute
+            )
             
+            logger.info("Cleared chat history for user: %s", user_id)
             return True
             
         except Exception as e:
-            print(f"❌ Error updating session data: {e}")
+            logger.error("Error clearing chat history: %s", e)
             return False
 
 # Create global instance
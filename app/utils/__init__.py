@@ -17,7 +17,7 @@ from .functions import (
     find_doctor_for_service,
     validate_service
 )
-from .prompt import get_system_prompt, validate_clinic_data_structure
+from .prompt import get_system_prompt, get_system_prompt_for, validate_clinic_data_structure
 
 __all__ = [
     "available_slots", 
@@ -27,5 +27,6 @@ __all__ = [
     "find_doctor_for_service",
     "validate_service",
     "get_system_prompt", 
+    "get_system_prompt_for",
     "validate_clinic_data_structure"
 ]
\ No newline at end of file
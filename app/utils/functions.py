@@ -2,59 +2,56 @@ from typing import List, Dict
 import datetime
 import asyncio
 import json
-from app.services.calendar_service import calendar_service
+import logging
+import re
+from app.services.calendar_service import calendar_service, _zi, _UTC
+
+logger = logging.getLogger(__name__)
+
+# Slots as offered by available_slots ("2025-07-21 09:00 AM"), or 24-hour ("2025-07-21 14:30")
+_SLOT_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2}) (\d{1,2}):(\d{2})(?: ([AaPp])[Mm])?')
+
+def _parse_slot(slot: str) -> datetime.datetime:
+    """Parse a slot string; strptime is only used for inputs the regex doesn't cover"""
+    match = _SLOT_RE.fullmatch(slot)
+    if match:
+        year, month, day, hour, minute, meridiem = match.groups()
+        hour = int(hour)
+        if meridiem is None:
+            return datetime.datetime(int(year), int(month), int(day), hour, int(minute))
+        if 1 <= hour <= 12:
+            hour = hour % 12 + (12 if meridiem in 'Pp' else 0)
+            return datetime.datetime(int(year), int(month), int(day), hour, int(minute))
+    
+    try:
+        return datetime.datetime.strptime(slot, "%Y-%m-%d %I:%M %p")
+    except ValueError:
+        # Try alternative format: "2025-07-21 09:00"
+        return datetime.datetime.strptime(slot, "%Y-%m-%d %H:%M")
 
 def find_doctor_for_service(service: str, clinic_data: Dict = None) -> Dict:
     """
     Find the appropriate doctor for a given service.
     Returns doctor info including email and duration.
     """
-    if not clinic_data or 'Doctors' not in clinic_data:
+    logger.debug("Looking for doctor who provides service: '%s'", service)
+    match = calendar_service.match_service(service, clinic_data)
+    if match is None:
+        logger.debug("No doctor found for service: '%s'", service)
         return {}
     
-    service_lower = service.lower()
-    print(f"🔍 Looking for doctor who provides service: '{service}'")
-    
-    for doctor in clinic_data['Doctors']:
-        services = doctor.get('Services', {})
-        print(f"   Checking Dr. {doctor.get('Name')}: {list(services.keys())}")
-        
-        # Check for exact match first
-        for available_service in services:
-            if available_service.lower() == service_lower:
-                try:
-                    duration_minutes = int(services[available_service].split()[0])
-                except:
-                    duration_minutes = 30
-                
-                print(f"✅ Found exact match: Dr. {doctor.get('Name')} provides '{available_service}'")
-                return {
-                    'name': doctor.get('Name'),
-                    'email': doctor.get('Calendar_email'),
-                    'speciality': doctor.get('Speciality'),
-                    'service_duration': duration_minutes,
-                    'found_service': available_service
-                }
-        
-        # Check for partial match
-        for available_service in services:
-            if service_lower in available_service.lower() or available_service.lower() in service_lower:
-                try:
-                    duration_minutes = int(services[available_service].split()[0])
-                except:
-                    duration_minutes = 30
-                
-                print(f"✅ Found partial match: Dr. {doctor.get('Name')} provides '{available_service}' for requested '{service}'")
-                return {
-                    'name': doctor.get('Name'),
-                    'email': doctor.get('Calendar_email'),
-                    'speciality': doctor.get('Speciality'),
-                    'service_duration': duration_minutes,
-                    'found_service': available_service
-                }
-    
-    print(f"❌ No doctor found for service: '{service}'")
-    return {}
+    doctor, available_service, duration_minutes, exact = match
+    logger.debug(
+        "Found %s match: Dr. %s provides '%s' for requested '%s'",
+        "exact" if exact else "partial", doctor.get('Name'), available_service, service
+    )
+    return {
+        'name': doctor.get('Name'),
+        'email': doctor.get('Calendar_email'),
+        'speciality': doctor.get('Speciality'),
+        'service_duration': duration_minutes,
+        'found_service': available_service
+    }
 
 async def available_slots(service: str, date: str, clinic_data: Dict = None) -> List[str]:
     """
@@ -66,7 +63,7 @@ async def available_slots(service: str, date: str, clinic_data: Dict = None) ->
         appointment_date = datetime.datetime.strptime(date, "%Y-%m-%d")
         date_str = appointment_date.strftime("%Y-%m-%d")
         
-        print(f"🔍 Checking available slots for service '{service}' on {date_str}")
+        logger.debug("Checking available slots for service '%s' on %s", service, date_str)
         
         # Get clinic timezone from clinic data
         clinic_timezone = clinic_data.get('timezone', 'Asia/Karachi') if clinic_data else 'Asia/Karachi'
@@ -87,14 +84,14 @@ async def available_slots(service: str, date: str, clinic_data: Dict = None) ->
             formatted_slot = f"{date_str} {slot['formatted_time_only']}"
             formatted_slots.append(formatted_slot)
         
-        print(f"✅ Found {len(formatted_slots)} available slots for '{service}'")
+        logger.debug("Found %d available slots for '%s'", len(formatted_slots), service)
         return formatted_slots
         
     except ValueError as e:
-        print(f"❌ Date parsing error: {e}")
+        logger.warning("Date parsing error: %s", e)
         return []
     except Exception as e:
-        print(f"❌ Error getting available slots: {e}")
+        logger.error("Error getting available slots: %s", e)
         return []
 
 async def book_appointment(
@@ -109,29 +106,17 @@ async def book_appointment(
     Automatically finds the right doctor for the service.
     """
     try:
-        print(f"📅 Booking appointment:")
-        print(f"   Service: {service}")
-        print(f"   Patient: {patient_name}")
-        print(f"   Slot: {slot}")
+        logger.info("Booking appointment: service=%s patient=%s slot=%s", service, patient_name, slot)
         
         # Parse the slot datetime
-        try:
-            slot_datetime = datetime.datetime.strptime(slot, "%Y-%m-%d %I:%M %p")
-        except ValueError:
-            # Try alternative format: "2025-07-21 09:00"
-            slot_datetime = datetime.datetime.strptime(slot, "%Y-%m-%d %H:%M")
+        slot_datetime = _parse_slot(slot)
         
         # Get clinic timezone
         clinic_timezone = clinic_data.get('timezone', 'Asia/Karachi') if clinic_data else 'Asia/Karachi'
         
         # Convert to UTC for Google Calendar
-        from zoneinfo import ZoneInfo
-        clinic_tz = ZoneInfo(clinic_timezone)
-        utc_tz = ZoneInfo("UTC")
-        
-        # Create timezone-aware datetime
-        slot_datetime_local = slot_datetime.replace(tzinfo=clinic_tz)
-        slot_datetime_utc = slot_datetime_local.astimezone(utc_tz)
+        slot_datetime_local = slot_datetime.replace(tzinfo=_zi(clinic_timezone))
+        slot_datetime_utc = slot_datetime_local.astimezone(_UTC)
         
         # Use calendar service to book the appointment
         # The calendar service will automatically find the right doctor and duration
@@ -172,16 +157,16 @@ async def book_appointment(
             
             confirmation_message += "Please arrive 10 minutes early. Thank you!"
             
-            print(f"✅ Appointment booked successfully for {duration_minutes} minutes")
+            logger.info("Appointment booked successfully for %s minutes", duration_minutes)
             return confirmation_message
         else:
             error_msg = booking_result.get("error", "Unknown error occurred")
-            print(f"❌ Booking failed: {error_msg}")
+            logger.warning("Booking failed: %s", error_msg)
             clinic_phone = clinic_data.get('phone', '03458589440') if clinic_data else '03458589440'
             return f"Sorry, there was an error booking your appointment: {error_msg}. Please try again or call us at {clinic_phone}."
         
     except Exception as e:
-        print(f"❌ Error booking appointment: {e}")
+        logger.error("Error booking appointment: %s", e)
         clinic_phone = clinic_data.get('phone', '03458589440') if clinic_data else '03458589440'
         return f"Sorry, there was an error booking your appointment. Please try again or call us at {clinic_phone}."
 
@@ -213,15 +198,16 @@ def get_doctor_info(speciality: str = None, service: str = None, clinic_data: Di
     for doctor in clinic_data['Doctors']:
         doctor_key = doctor.get('Speciality', '').lower().replace(' ', '_').replace('and_', '').replace('surgeon', '').strip('_')
         services_with_duration = {}
+        service_minutes = calendar_service.service_minutes(doctor)
         
         for service_name, duration_str in doctor.get('Services', {}).items():
-            try:
-                duration_minutes = int(duration_str.split()[0])
+            minutes = service_minutes[service_name]
+            if minutes is not None:
                 services_with_duration[service_name] = {
-                    'duration_minutes': duration_minutes,
+                    'duration_minutes': minutes,
                     'duration_display': duration_str
                 }
-            except:
+            else:
                 services_with_duration[service_name] = {
                     'duration_minutes': 30,
                     'duration_display': '30 min'
@@ -254,11 +240,11 @@ def get_all_services(clinic_data: Dict = None) -> Dict:
         doctor_email = doctor.get('Calendar_email', '')
         speciality = doctor.get('Speciality', '')
         timings = doctor.get('Timings', '')
+        service_minutes = calendar_service.service_minutes(doctor)
         
         for service_name, duration_str in doctor.get('Services', {}).items():
-            try:
-                duration_minutes = int(duration_str.split()[0])
-            except:
+            duration_minutes = service_minutes[service_name]
+            if duration_minutes is None:
                 duration_minutes = 30
             
             services_info[service_name] = {
@@ -279,50 +265,25 @@ def validate_service(service: str, clinic_data: Dict = None) -> Dict:
     if not clinic_data or 'Doctors' not in clinic_data:
         return {"valid": False, "message": "No clinic data available"}
     
-    service_lower = service.lower()
-    
-    for doctor in clinic_data['Doctors']:
-        services = doctor.get('Services', {})
-        
-        # Check for exact match
-        for available_service in services:
-            if available_service.lower() == service_lower:
-                try:
-                    duration_minutes = int(services[available_service].split()[0])
-                except:
-                    duration_minutes = 30
-                
-                return {
-                    "valid": True,
-                    "service_name": available_service,
-                    "doctor_name": doctor.get('Name'),
-                    "doctor_email": doctor.get('Calendar_email'),
-                    "duration_minutes": duration_minutes,
-                    "speciality": doctor.get('Speciality')
-                }
-        
-        # Check for partial match
-        for available_service in services:
-            if service_lower in available_service.lower() or available_service.lower() in service_lower:
-                try:
-                    duration_minutes = int(services[available_service].split()[0])
-                except:
-                    duration_minutes = 30
-                
-                return {
-                    "valid": True,
-                    "service_name": available_service,
-                    "doctor_name": doctor.get('Name'),
-                    "doctor_email": doctor.get('Calendar_email'),
-                    "duration_minutes": duration_minutes,
-                    "speciality": doctor.get('Speciality'),
-                    "note": f"Matched '{service}' to '{available_service}'"
-                }
+    match = calendar_service.match_service(service, clinic_data)
+    if match is not None:
+        doctor, available_service, duration_minutes, exact = match
+        result = {
+            "valid": True,
+            "service_name": available_service,
+            "doctor_name": doctor.get('Name'),
+            "doctor_email": doctor.get('Calendar_email'),
+            "duration_minutes": duration_minutes,
+            "speciality": doctor.get('Speciality')
+        }
+        if not exact:
+            result["note"] = f"Matched '{service}' to '{available_service}'"
+        return result
     
-    # Get list of all available services for suggestion
-    all_services = []
-    for doctor in clinic_data['Doctors']:
-        all_services.extend(list(doctor.get('Services', {}).keys()))
+    # Get list of all available services for suggestion (once each, in doctor order)
+    all_services = list(dict.fromkeys(
+        service_name for doctor in clinic_data['Doctors'] for service_name in doctor.get('Services', {})
+    ))
     
     return {
         "valid": False,
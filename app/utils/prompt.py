@@ -1,22 +1,106 @@
-import json
-from datetime import datetime
+import hashlib
+import time
+from collections import namedtuple
+from datetime import date, datetime, time as dt_time, timedelta
+from functools import lru_cache
+
+import orjson
+from cachetools import LRUCache
+
+from app.config.settings import settings
+
+class _PromptKey:
+    """Hashable cache key that carries the (unhashable) clinic_data it was built from"""
+    __slots__ = ("key", "clinic_data")
+
+    def __init__(self, key: tuple, clinic_data: dict):
+        self.key = key
+        self.clinic_data = clinic_data
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, _PromptKey) and self.key == other.key
+
+@lru_cache(maxsize=256)
+def _get_system_prompt_memo(prompt_key: _PromptKey) -> str:
+    today_date = prompt_key.key[-1]
+    return _render_system_prompt(prompt_key.clinic_data, today_date)
+
+def get_system_prompt_for(clinic_id: str, version, clinic_data: dict) -> str:
+    """
+    Memoized system prompt, keyed on the clinic, its version and today's date.
+    The prompt embeds the current date, so it is rebuilt when the day changes; within a day
+    the output is byte-identical, which also keeps OpenAI's prompt-prefix cache warm.
+    """
+    prompt_key = _PromptKey((clinic_id, version, _today()), clinic_data)
+    return _get_system_prompt_memo(prompt_key)
+
+# (local YYYY-MM-DD, epoch seconds of the next local midnight)
+_today_cache = ("", 0.0)
+
+def _today() -> str:
+    """Today's local date as YYYY-MM-DD, recomputed only when the day changes"""
+    global _today_cache
+    today, rolls_over_at = _today_cache
+    if time.time() >= rolls_over_at:
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        next_midnight = datetime.combine(now.date() + timedelta(days=1), dt_time.min)
+        _today_cache = (today, next_midnight.timestamp())
+    return today
 
 def get_system_prompt(clinic_data: dict) -> str:
     """
     Generate a generic system prompt that works with any clinic data structure
     """
-    # Get today's date to include in the prompt
-    today_date = datetime.now().strftime("%Y-%m-%d")
-    
+    return get_system_prompt_for(clinic_data.get('clinic_id'), _clinic_version(clinic_data), clinic_data)
+
+# id(clinic_data) -> (clinic_data, digest); the entry keeps a reference to clinic_data so
+# the id can't be reused while cached, and a reloaded clinic_data (new object) is rehashed
+_version_cache: LRUCache = LRUCache(maxsize=256)
+
+def _clinic_version(clinic_data: dict) -> bytes:
+    """
+    Hash of the clinic's content, computed once per clinic_data object. updated_at alone
+    misses deleted doctors and edits that don't touch it, and would keep stale prompts.
+    """
+    entry = _version_cache.get(id(clinic_data))
+    if entry is not None and entry[0] is clinic_data:
+        return entry[1]
+    digest = _content_hash(clinic_data)
+    _version_cache[id(clinic_data)] = (clinic_data, digest)
+    return digest
+
+def _content_hash(clinic_data: dict) -> bytes:
+    """Digest of the canonicalized clinic data"""
+    canonical = orjson.dumps(clinic_data, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(canonical, digest_size=16).digest()
+
+def _render_system_prompt(clinic_data: dict, today_date: str) -> str:
+    """
+    Render the system prompt for a clinic (uncached)
+    """
     # Extract clinic information safely
     clinic_name = clinic_data.get('clinic_name', 'Our Clinic')
     clinic_phone = clinic_data.get('phone', clinic_data.get('whatsapp_contact', 'N/A'))
-    clinic_timezone = clinic_data.get('timezone', 'Asia/Karachi')
+    # Spelled out so the model doesn't have to do date arithmetic
+    tomorrow_date = (date.fromisoformat(today_date) + timedelta(days=1)).isoformat()
     
     # Build service mapping dynamically
     service_mapping = _build_service_mapping(clinic_data)
     duration_info = _build_duration_info(clinic_data)
     
+    # Compact JSON: indentation only adds prompt tokens (pretty-printed when DEBUG is on)
+    clinic_json = orjson.dumps(
+        clinic_data,
+        option=orjson.OPT_INDENT_2 if settings.debug else 0,
+        default=str
+    ).decode()
+    
+    # Kept as an f-string: it compiles to a single string build over pre-split literals,
+    # which is faster than str.format_map on a hoisted template (that re-parses it per call)
     return f"""
 You are a professional, friendly AI receptionist for {clinic_name}. You help patients with:
 
@@ -25,7 +109,8 @@ You are a professional, friendly AI receptionist for {clinic_name}. You help pat
 3. Answering questions in either English or Roman Urdu, depending on the user's input language
 
 📅 CURRENT DATE: {today_date}
-IMPORTANT: When checking availability, always use current or future dates. If a user says "today", use {today_date}.
+📅 TOMORROW: {tomorrow_date}
+IMPORTANT: When checking availability, always use current or future dates. If a user says "today", use {today_date}. If a user says "tomorrow", use {tomorrow_date}.
 
 🧠 LANGUAGE BEHAVIOR:
 - Automatically detect the input language
@@ -33,7 +118,7 @@ IMPORTANT: When checking availability, always use current or future dates. If a
 - If the user sends a message in English, respond in English
 
 🏥 CLINIC INFORMATION:
-{json.dumps(clinic_data, indent=2)}
+{clinic_json}
 
 🎯 SERVICE-TO-DOCTOR MAPPING:
 The system automatically finds the right doctor for each service based on the clinic data above.
@@ -55,7 +140,7 @@ Each service has a specific duration that is automatically used for slot calcula
    - The system will automatically find the right doctor and use correct duration
    - Always use current or future dates (today is {today_date})
    - If user says "today", use {today_date}
-   - If user says "tomorrow", calculate tomorrow's date
+   - If user says "tomorrow", use {tomorrow_date}
    - Offer 3-4 relevant free slots
    - Once confirmed, call book_appointment with patient details (name and phone required)
 
@@ -118,7 +203,7 @@ We're here to help with any questions related to our clinic and services. 😊"
 EXAMPLE BOOKING FLOW:
 User: "I want to book [service] tomorrow"
 Assistant: "I'll check available slots for [service] tomorrow. Let me see what's available."
-[Call available_slots with service="[service]" and tomorrow's date]
+[Call available_slots with service="[service]" and date="{tomorrow_date}"]
 [Show available slots with correct duration]
 [Once user chooses, call book_appointment with the service and slot]
 
@@ -129,90 +214,103 @@ REMEMBER:
 - Use the clinic data provided for all information
 """
 
-def _build_service_mapping(clinic_data: dict) -> str:
+# Everything the prompt and summary helpers derive from clinic_data['Doctors']
+_ClinicIndex = namedtuple('_ClinicIndex', 'service_mapping duration_info services doctor_names specialities')
+
+@lru_cache(maxsize=256)
+def _get_clinic_index_memo(index_key: _PromptKey) -> _ClinicIndex:
+    return _build_clinic_index(index_key.clinic_data)
+
+def _clinic_index(clinic_data: dict) -> _ClinicIndex:
+    """The clinic's _ClinicIndex, built once per clinic version"""
+    clinic_data = clinic_data or {}
+    index_key = _PromptKey((clinic_data.get('clinic_id'), _clinic_version(clinic_data)), clinic_data)
+    return _get_clinic_index_memo(index_key)
+
+def _build_clinic_index(clinic_data: dict) -> _ClinicIndex:
     """
-    Build a dynamic service mapping description from clinic data
+    Build the service mapping and duration descriptions and the service, doctor and
+    speciality lists in a single pass over the doctors
     """
     if not clinic_data or 'Doctors' not in clinic_data:
-        return "No service mapping available."
+        return _ClinicIndex(
+            "No service mapping available.", "Duration information not available.", (), (), ()
+        )
     
-    mapping_lines = []
+    # Both descriptions are assembled as flat lists of fragments and joined once
+    mapping_parts = []
+    duration_parts = []
+    services = {}
+    doctor_names = []
+    specialities = {}
     
-    for doctor in clinic_data.get('Doctors', []):
-        doctor_name = doctor.get('Name', 'Unknown Doctor')
-        speciality = doctor.get('Speciality', 'General')
-        services = list(doctor.get('Services', {}).keys())
+    # `or ()`: the empty tuple is a shared constant, so missing/null fields allocate nothing
+    for doctor in clinic_data['Doctors'] or ():
+        doctor_name = doctor.get('Name')
+        speciality = doctor.get('Speciality')
+        doctor_services = doctor.get('Services')
         
-        if services:
-            services_list = ", ".join(services)
-            mapping_lines.append(f"- {speciality} services ({services_list}) → {doctor_name}")
-    
-    if not mapping_lines:
-        return "No services configured."
+        if doctor_services:
+            if mapping_parts:
+                mapping_parts.append("\n")
+            mapping_parts += (
+                "- ", str(doctor.get('Speciality', 'General')),
+                " services (", ", ".join(doctor_services),
+                ") → ", str(doctor.get('Name', 'Unknown Doctor'))
+            )
+            
+            for service_name, duration_str in doctor_services.items():
+                services[service_name] = None
+                if duration_parts:
+                    duration_parts.append("\n")
+                head = duration_str.split(maxsplit=1) if isinstance(duration_str, str) else ()
+                if head and head[0].isdecimal():
+                    duration_parts += ("- ", service_name, ": ", str(int(head[0])), " minutes")
+                else:
+                    duration_parts += ("- ", service_name, ": ", str(duration_str))
+        
+        if doctor_name:
+            doctor_names.append(doctor_name)
+        if speciality:
+            specialities[speciality] = None
     
-    return "\n".join(mapping_lines)
+    return _ClinicIndex(
+        "".join(mapping_parts) if mapping_parts else "No services configured.",
+        "".join(duration_parts) if duration_parts else "No duration information available.",
+        tuple(services),
+        tuple(doctor_names),
+        tuple(specialities)
+    )
+
+def _build_service_mapping(clinic_data: dict) -> str:
+    """
+    Build a dynamic service mapping description from clinic data
+    """
+    return _clinic_index(clinic_data).service_mapping
 
 def _build_duration_info(clinic_data: dict) -> str:
     """
     Build a dynamic duration information description from clinic data
     """
-    if not clinic_data or 'Doctors' not in clinic_data:
-        return "Duration information not available."
-    
-    duration_lines = []
-    
-    for doctor in clinic_data.get('Doctors', []):
-        for service_name, duration_str in doctor.get('Services', {}).items():
-            try:
-                duration_minutes = int(duration_str.split()[0])
-                duration_lines.append(f"- {service_name}: {duration_minutes} minutes")
-            except:
-                duration_lines.append(f"- {service_name}: {duration_str}")
-    
-    if not duration_lines:
-        return "No duration information available."
-    
-    return "\n".join(duration_lines)
+    return _clinic_index(clinic_data).duration_info
 
 def _extract_available_services(clinic_data: dict) -> list:
     """
-    Extract all available services from clinic data
+    Extract all available services from clinic data (without duplicates)
     """
-    services = []
-    
-    if clinic_data and 'Doctors' in clinic_data:
-        for doctor in clinic_data['Doctors']:
-            services.extend(list(doctor.get('Services', {}).keys()))
-    
-    return list(set(services))  # Remove duplicates
+    return list(_clinic_index(clinic_data).services)
 
 def _extract_doctor_names(clinic_data: dict) -> list:
     """
     Extract all doctor names from clinic data
     """
-    doctors = []
-    
-    if clinic_data and 'Doctors' in clinic_data:
-        for doctor in clinic_data['Doctors']:
-            name = doctor.get('Name')
-            if name:
-                doctors.append(name)
-    
-    return doctors
+    return list(_clinic_index(clinic_data).doctor_names)
 
 def _extract_specialities(clinic_data: dict) -> list:
     """
-    Extract all specialities from clinic data
+    Extract all specialities from clinic data (without duplicates)
     """
-    specialities = []
-    
-    if clinic_data and 'Doctors' in clinic_data:
-        for doctor in clinic_data['Doctors']:
-            speciality = doctor.get('Speciality')
-            if speciality:
-                specialities.append(speciality)
-    
-    return list(set(specialities))  # Remove duplicates
+    return list(_clinic_index(clinic_data).specialities)
 
 def get_clinic_summary(clinic_data: dict) -> str:
     """
@@ -222,7 +320,7 @@ def get_clinic_summary(clinic_data: dict) -> str:
         return "No clinic data available"
     
     clinic_name = clinic_data.get('clinic_name', 'Unknown Clinic')
-    total_doctors = len(clinic_data.get('Doctors', []))
+    total_doctors = len(clinic_data.get('Doctors') or ())
     all_services = _extract_available_services(clinic_data)
     all_specialities = _extract_specialities(clinic_data)
     
@@ -244,59 +342,53 @@ Available Services: {', '.join(all_services)}
     
     return summary
 
+# Checked by validate_clinic_data_structure; missing ones only produce warnings
+_DOCTOR_FIELDS = ('Name', 'Calendar_email', 'Services')
+_OPTIONAL_CLINIC_FIELDS = ('clinic_name', 'address', 'phone', 'timezone')
+
 def validate_clinic_data_structure(clinic_data: dict) -> dict:
     """
     Validate that clinic data has the expected structure
     """
-    validation_result = {
-        "valid": True,
-        "errors": [],
-        "warnings": []
-    }
-    
     # Check required fields
     if not isinstance(clinic_data, dict):
-        validation_result["valid"] = False
-        validation_result["errors"].append("Clinic data must be a dictionary")
-        return validation_result
+        return {"valid": False, "errors": ["Clinic data must be a dictionary"], "warnings": []}
+    
+    errors = []
+    warnings = []
     
     # Check for doctors array
+    doctors = clinic_data.get('Doctors')
     if 'Doctors' not in clinic_data:
-        validation_result["valid"] = False
-        validation_result["errors"].append("Missing 'Doctors' field")
-    elif not isinstance(clinic_data['Doctors'], list):
-        validation_result["valid"] = False
-        validation_result["errors"].append("'Doctors' must be a list")
-    elif len(clinic_data['Doctors']) == 0:
-        validation_result["warnings"].append("No doctors defined")
+        errors.append("Missing 'Doctors' field")
+    elif not isinstance(doctors, list):
+        errors.append("'Doctors' must be a list")
+    elif not doctors:
+        warnings.append("No doctors defined")
     
     # Check doctor structure
-    if validation_result["valid"] and 'Doctors' in clinic_data:
-        for i, doctor in enumerate(clinic_data['Doctors']):
+    if not errors:
+        for i, doctor in enumerate(doctors):
             if not isinstance(doctor, dict):
-                validation_result["errors"].append(f"Doctor {i} must be a dictionary")
+                errors.append(f"Doctor {i} must be a dictionary")
                 continue
             
             # Check required doctor fields
-            required_fields = ['Name', 'Calendar_email', 'Services']
-            for field in required_fields:
+            for field in _DOCTOR_FIELDS:
                 if field not in doctor:
-                    validation_result["warnings"].append(f"Doctor {i} missing '{field}' field")
+                    warnings.append(f"Doctor {i} missing '{field}' field")
             
             # Check services structure
             if 'Services' in doctor:
-                if not isinstance(doctor['Services'], dict):
-                    validation_result["warnings"].append(f"Doctor {i} Services must be a dictionary")
-                elif len(doctor['Services']) == 0:
-                    validation_result["warnings"].append(f"Doctor {i} has no services defined")
+                services = doctor['Services']
+                if not isinstance(services, dict):
+                    warnings.append(f"Doctor {i} Services must be a dictionary")
+                elif not services:
+                    warnings.append(f"Doctor {i} has no services defined")
     
     # Check optional clinic fields
-    optional_fields = ['clinic_name', 'address', 'phone', 'timezone']
-    for field in optional_fields:
+    for field in _OPTIONAL_CLINIC_FIELDS:
         if field not in clinic_data:
-            validation_result["warnings"].append(f"Missing optional field '{field}'")
-    
-    if validation_result["errors"]:
-        validation_result["valid"] = False
+            warnings.append(f"Missing optional field '{field}'")
     
-    return validation_result
\ No newline at end of file
+    return {"valid": not errors, "errors": errors, "warnings": warnings}
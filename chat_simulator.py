@@ -5,12 +5,45 @@ A command-line interface to test the chatbot API
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+# orjson parses the (often multi-KB) replies faster; the simulator also runs without it
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _response_json(response: requests.Response):
+    """Decode a JSON response body"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(response.content)
+    return json.loads(response.content)
+
+if sys.version_info >= (3, 11):
+    def _format_timestamp(value: str) -> str:
+        """Format an ISO timestamp for display (fromisoformat accepts 'Z' since 3.11)"""
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %I:%M %p')
+else:
+    def _format_timestamp(value: str) -> str:
+        """Format an ISO timestamp for display"""
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %I:%M %p')
 
 class ChatSimulator:
+    # Seconds to wait for the API; chat replies include the OpenAI (and calendar) round-trips
+    REQUEST_TIMEOUT = 10
+    CHAT_TIMEOUT = 120
+    # Seconds a clinic's /services response is reused
+    SERVICES_CACHE_TTL = 300
+
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
         self.selected_clinic = None
@@ -18,7 +51,29 @@ class ChatSimulator:
         self.user_name = None
         self.session_id = None
         self.user_id = None
+        # Chat commands that don't leave the chat loop
+        self._commands = {
+            '/history': self.get_chat_history,
+            '/appointments': self.get_appointments,
+            '/services': lambda: self.get_clinic_services(self.selected_clinic['clinic_id']),
+            '/clear': self.clear_history,
+            '/help': self.show_chat_commands
+        }
+        # clinic_id -> (expires_at, /services response data)
+        self._services_cache: Dict[str, Tuple[float, Dict]] = {}
+        
+        # One keep-alive connection pool for every API call
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         
+    @staticmethod
+    def _write_lines(lines: List[str]) -> None:
+        """Write a block of output lines with a single write"""
+        sys.stdout.write("\n".join(lines) + "\n")
+    
     def print_header(self):
         """Print welcome header"""
         print("=" * 60)
@@ -29,9 +84,9 @@ class ChatSimulator:
     def check_health(self) -> bool:
         """Check if the API is running"""
         try:
-            response = requests.get(f"{self.base_url}/api/v1/health/")
+            response = self.session.get(f"{self.base_url}/api/v1/health/", timeout=self.REQUEST_TIMEOUT)
             if response.status_code == 200:
-                health_data = response.json()
+                health_data = _response_json(response)
                 print("✅ API Health Status:")
                 print(f"   Status: {health_data.get('status', 'unknown')}")
                 
@@ -55,29 +110,35 @@ class ChatSimulator:
             print(f"❌ Health check error: {e}")
             return False
     
-    def get_clinics(self) -> List[Dict]:
-        """Fetch available clinics"""
+    def _fetch_clinics(self) -> Tuple[List[Dict], Optional[str]]:
+        """Fetch available clinics without printing; returns (clinics, error message)"""
         try:
-            response = requests.get(f"{self.base_url}/api/v1/clinics/")
+            response = self.session.get(f"{self.base_url}/api/v1/clinics/", timeout=self.REQUEST_TIMEOUT)
             if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"❌ Failed to fetch clinics: {response.status_code}")
-                return []
+                return _response_json(response), None
+            return [], f"❌ Failed to fetch clinics: {response.status_code}"
         except Exception as e:
-            print(f"❌ Error fetching clinics: {e}")
-            return []
+            return [], f"❌ Error fetching clinics: {e}"
+    
+    def get_clinics(self) -> List[Dict]:
+        """Fetch available clinics"""
+        clinics, error = self._fetch_clinics()
+        if error:
+            print(error)
+        return clinics
     
     def display_clinics(self, clinics: List[Dict]) -> None:
         """Display available clinics"""
-        print("🏥 AVAILABLE CLINICS:")
-        print("-" * 40)
+        lines = ["🏥 AVAILABLE CLINICS:", "-" * 40]
         for i, clinic in enumerate(clinics, 1):
-            print(f"{i}. {clinic['clinic_name']}")
-            print(f"   ID: {clinic['clinic_id']}")
-            print(f"   📍 {clinic.get('address', 'N/A')}")
-            print(f"   📞 {clinic.get('phone', 'N/A')}")
-            print()
+            lines += [
+                f"{i}. {clinic['clinic_name']}",
+                f"   ID: {clinic['clinic_id']}",
+                f"   📍 {clinic.get('address', 'N/A')}",
+                f"   📞 {clinic.get('phone', 'N/A')}",
+                ""
+            ]
+        self._write_lines(lines)
     
     def select_clinic(self, clinics: List[Dict]) -> Optional[Dict]:
         """Let user select a clinic"""
@@ -116,30 +177,44 @@ class ChatSimulator:
         print(f"\n✅ User: {self.user_name} ({self.user_phone})")
         return True
     
+    def _fetch_clinic_services(self, clinic_id: str) -> Optional[Dict]:
+        """Fetch a clinic's services, reusing the response for SERVICES_CACHE_TTL seconds"""
+        cached = self._services_cache.get(clinic_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        response = self.session.get(f"{self.base_url}/api/v1/clinics/{clinic_id}/services", timeout=self.REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            return None
+        
+        data = _response_json(response)
+        self._services_cache[clinic_id] = (time.monotonic() + self.SERVICES_CACHE_TTL, data)
+        return data
+    
     def get_clinic_services(self, clinic_id: str) -> None:
         """Display clinic services"""
         try:
-            response = requests.get(f"{self.base_url}/api/v1/clinics/{clinic_id}/services")
-            if response.status_code == 200:
-                data = response.json()
+            data = self._fetch_clinic_services(clinic_id)
+            if data is not None:
                 services = data.get('services', {})
                 clinic_info = data.get('clinic_info', {})
                 
-                print(f"\n🩺 SERVICES AT {clinic_info.get('name', 'This Clinic')}:")
-                print("-" * 50)
+                lines = [f"\n🩺 SERVICES AT {clinic_info.get('name', 'This Clinic')}:", "-" * 50]
                 
                 for service, details in services.items():
                     doctor_name = details.get('doctor_name', 'Unknown')
                     speciality = details.get('speciality', 'General')
                     duration = details.get('duration_display', 'Unknown duration')
                     
-                    print(f"• {service}")
-                    print(f"  👨‍⚕️ Dr. {doctor_name} ({speciality})")
-                    print(f"  ⏱️  Duration: {duration}")
-                    print()
+                    lines += [
+                        f"• {service}",
+                        f"  👨‍⚕️ Dr. {doctor_name} ({speciality})",
+                        f"  ⏱️  Duration: {duration}",
+                        ""
+                    ]
                 
-                print("💬 You can ask about any of these services or book appointments!")
-                print()
+                lines += ["💬 You can ask about any of these services or book appointments!", ""]
+                self._write_lines(lines)
         except Exception as e:
             print(f"❌ Error fetching services: {e}")
     
@@ -154,14 +229,14 @@ class ChatSimulator:
         
         try:
             print("🤖 Thinking...")
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/v1/chat",
                 json=payload,
-                headers={"Content-Type": "application/json"}
+                timeout=self.CHAT_TIMEOUT
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _response_json(response)
                 
                 # Store session info
                 if not self.session_id:
@@ -206,28 +281,28 @@ class ChatSimulator:
             url = f"{self.base_url}/api/v1/users/{self.user_phone}/history"
             params = {"clinic_id": self.selected_clinic['clinic_id']}
             
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
+                data = _response_json(response)
                 messages = data.get('messages', [])
                 
-                print("\n📝 CHAT HISTORY:")
-                print("-" * 30)
+                lines = ["\n📝 CHAT HISTORY:", "-" * 30]
                 
                 if not messages:
-                    print("No chat history found.")
+                    lines.append("No chat history found.")
                 else:
                     for msg in messages[-10:]:  # Show last 10 messages
                         role = msg.get('role', 'unknown')
                         content = msg.get('content', '')
                         
                         if role == 'user':
-                            print(f"👤 You: {content}")
+                            lines.append(f"👤 You: {content}")
                         elif role == 'assistant':
-                            print(f"🤖 Bot: {content}")
+                            lines.append(f"🤖 Bot: {content}")
                         elif role == 'tool':
-                            print(f"🔧 System: {content}")
-                        print()
+                            lines.append(f"🔧 System: {content}")
+                        lines.append("")
+                self._write_lines(lines)
             else:
                 print(f"❌ Failed to get history: {response.status_code}")
         except Exception as e:
@@ -239,16 +314,15 @@ class ChatSimulator:
             url = f"{self.base_url}/api/v1/users/{self.user_phone}/appointments"
             params = {"clinic_id": self.selected_clinic['clinic_id']}
             
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
+                data = _response_json(response)
                 appointments = data.get('appointments', [])
                 
-                print("\n📅 YOUR APPOINTMENTS:")
-                print("-" * 30)
+                lines = ["\n📅 YOUR APPOINTMENTS:", "-" * 30]
                 
                 if not appointments:
-                    print("No appointments found.")
+                    lines.append("No appointments found.")
                 else:
                     for apt in appointments:
                         service = apt.get('service', 'Unknown')
@@ -259,18 +333,20 @@ class ChatSimulator:
                         # Format datetime
                         if datetime_str:
                             try:
-                                dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-                                formatted_time = dt.strftime('%Y-%m-%d %I:%M %p')
-                            except:
+                                formatted_time = _format_timestamp(datetime_str)
+                            except ValueError:
                                 formatted_time = datetime_str
                         else:
                             formatted_time = 'Unknown time'
                         
-                        print(f"• {service}")
-                        print(f"  📅 {formatted_time}")
-                        print(f"  👨‍⚕️ Dr. {doctor_name}")
-                        print(f"  📋 Status: {status}")
-                        print()
+                        lines += [
+                            f"• {service}",
+                            f"  📅 {formatted_time}",
+                            f"  👨‍⚕️ Dr. {doctor_name}",
+                            f"  📋 Status: {status}",
+                            ""
+                        ]
+                self._write_lines(lines)
             else:
                 print(f"❌ Failed to get appointments: {response.status_code}")
         except Exception as e:
@@ -284,7 +360,7 @@ class ChatSimulator:
             
             confirm = input("Are you sure you want to clear your chat history? (yes/no): ").strip().lower()
             if confirm in ['yes', 'y']:
-                response = requests.delete(url, params=params)
+                response = self.session.delete(url, params=params, timeout=self.REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     print("✅ Chat history cleared successfully!")
                     self.session_id = None
@@ -316,26 +392,18 @@ class ChatSimulator:
                     continue
                 
                 # Handle commands
-                if user_input.lower() in ['/quit', 'q']:
+                command = user_input.lower()
+                if command in ('/quit', 'q'):
                     print("👋 Goodbye!")
                     break
-                elif user_input.lower() == '/history':
-                    self.get_chat_history()
-                    continue
-                elif user_input.lower() == '/appointments':
-                    self.get_appointments()
-                    continue
-                elif user_input.lower() == '/services':
-                    self.get_clinic_services(self.selected_clinic['clinic_id'])
-                    continue
-                elif user_input.lower() == '/clear':
-                    self.clear_history()
-                    continue
-                elif user_input.lower() == '/switch':
+                elif command == '/switch':
+                    self._services_cache.pop(self.selected_clinic['clinic_id'], None)
                     print("👋 Switching clinics...")
                     break
-                elif user_input.lower() == '/help':
-                    self.show_chat_commands()
+                
+                handler = self._commands.get(command)
+                if handler is not None:
+                    handler()
                     continue
                 
                 # Send message to bot
@@ -356,13 +424,22 @@ class ChatSimulator:
         """Main simulator loop"""
         self.print_header()
         
-        # Check API health
-        if not self.check_health():
+        # Check API health while the clinic list loads; the fetch stays silent so its
+        # error can't interleave with the health output, and is reported only if healthy
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            clinics_future = executor.submit(self._fetch_clinics)
+            healthy = self.check_health()
+            clinics, error = clinics_future.result()
+        
+        if not healthy:
             return
+        if error:
+            print(error)
         
         while True:
-            # Get clinics
-            clinics = self.get_clinics()
+            # Get clinics (already loaded on the first pass)
+            if clinics is None:
+                clinics = self.get_clinics()
             if not clinics:
                 print("❌ No clinics available. Make sure your database is set up.")
                 return
@@ -376,6 +453,7 @@ class ChatSimulator:
                 break
             
             self.selected_clinic = selected_clinic
+            clinics = None
             
             # Get user info
             if not self.get_user_info():
@@ -404,7 +482,10 @@ def main():
     args = parser.parse_args()
     
     simulator = ChatSimulator(base_url=args.url)
-    simulator.run()
+    try:
+        simulator.run()
+    finally:
+        simulator.session.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,24 +1,62 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import chat, clinics, users, health
 from app.config.settings import settings
+from app.services.openai_service import openai_service
+from app.services.cache_service import cache_service
+from app.services.calendar_service import calendar_service
+from app.services.pg_pool import pg_pool
+from app.services.supabase_service import supabase_service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared clients on startup and release them on shutdown"""
+    # Bound the threads used for blocking Supabase REST calls (asyncio.to_thread)
+    executor = ThreadPoolExecutor(max_workers=settings.thread_pool_workers, thread_name_prefix="blocking-io")
+    asyncio.get_running_loop().set_default_executor(executor)
+
+    await openai_service.startup()
+    await pg_pool.startup()
+    await calendar_service.startup()
+    await supabase_service.startup()
+    if app.openapi_url:
+        # Build (and memoize) the schema now rather than on the first /docs hit
+        app.openapi()
+    yield
+    await openai_service.shutdown()
+    # Flushes pending session updates, so it runs while the Postgres pool is still open
+    await supabase_service.shutdown()
+    await pg_pool.shutdown()
+    await cache_service.close()
+    calendar_service.shutdown()
+    executor.shutdown(wait=False)
 
 # Create FastAPI app
 app = FastAPI(
     title="Multi-Clinic Chatbot API",
     description="AI-powered chatbot system supporting multiple clinics and users",
     version="2.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
+    # Interactive docs and the OpenAPI schema are only served in debug mode
+    docs_url="/docs" if settings.debug else None,
+    redoc_url=None,
+    openapi_url="/openapi.json" if settings.debug else None,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
+cors_origins = [origin.strip() for origin in settings.cors_origins.split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=cors_origins,
+    # Browsers reject credentialed responses for a wildcard origin
+    allow_credentials="*" not in cors_origins,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,
 )
 
 # Include API routers
@@ -28,7 +66,7 @@ app.include_router(users.router, prefix="/api/v1")
 app.include_router(health.router, prefix="/api/v1")
 
 # Legacy endpoint for backward compatibility
-app.include_router(chat.router, tags=["legacy"])
+app.include_router(chat.legacy_router)
 
 @app.get("/")
 async def root():
@@ -37,7 +75,7 @@ async def root():
         "name": "Multi-Clinic Chatbot API",
         "version": "2.0.0",
         "status": "running",
-        "docs": "/docs",
+        "docs": app.docs_url,
         "health": "/api/v1/health"
     }
 
@@ -45,8 +83,13 @@ if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
+        host=settings.api_host,
+        port=settings.api_port,
+        workers=settings.api_workers,
+        # libuv event loop and C HTTP parser (uvloop isn't available on Windows)
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        # Reloading re-imports the whole app on every file change; development only
+        reload=settings.debug,
+        log_level=settings.log_level.lower()
     )
\ No newline at end of file
@@ -32,4 +32,4 @@ echo "🌟 Starting FastAPI development server..."
 echo "📖 API Documentation: http://localhost:8000/docs"
 echo "🏥 Health Check: http://localhost:8000/api/v1/health"
 echo ""
-uvicorn main:app --reload --host 0.0.0.0 --port 8000 --log-level info
\ No newline at end of file
+DEBUG=true uvicorn main:app --reload --host 0.0.0.0 --port 8000 --log-level info
\ No newline at end of file
@@ -5,34 +5,73 @@ Creates tables and populates with initial clinic data
 """
 
 import os
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from supabase import create_client, Client
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+import orjson
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def get_supabase_client():
-    """Initialize Supabase client"""
+def timed(label: str, fn, *args, **kwargs):
+    """Call fn(*args, **kwargs) and print how long it took"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"   ⏱️  {label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    return result
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Initialize the Supabase client once; every call reuses it and its keep-alive connections"""
     url = os.getenv("SUPABASE_URL")
     service_key = os.getenv("SUPABASE_SERVICE_KEY")  # Use service key for admin operations
     
     if not url or not service_key:
         raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in environment variables")
     
-    return create_client(url, service_key)
+    http_client = httpx.Client(
+        timeout=10.0,
+        transport=httpx.HTTPTransport(
+            # Idle connections are dropped after keepalive_expiry instead of being reused
+            # after the server side (or a pooler) may have closed them, and connection
+            # attempts that fail outright are retried once
+            retries=1,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=5.0)
+        )
+    )
+    return create_client(url, service_key, options=ClientOptions(httpx_client=http_client))
+
+def close_supabase_client():
+    """Close the shared client's HTTP connections"""
+    if get_supabase_client.cache_info().currsize:
+        get_supabase_client().options.httpx_client.close()
+        get_supabase_client.cache_clear()
+
+# Run once in the Supabase SQL editor so create_tables can apply the schema itself.
+# Only the service role may call it.
+EXEC_SQL_FUNCTION = """
+CREATE OR REPLACE FUNCTION exec_sql(sql TEXT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE sql;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION exec_sql(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION exec_sql(TEXT) TO service_role;
+"""
 
 def create_tables(supabase: Client):
     """Create all necessary tables"""
     
     print("🏗️  Creating tables...")
     
-    # Note: In Supabase, you typically create tables via the dashboard or SQL editor
-    # This script assumes tables are already created. If you need to create them programmatically,
-    # you would use the supabase.rpc() method to call SQL functions.
-    
-    # For reference, here are the SQL commands you would run in Supabase SQL editor:
+    # Applied in one exec_sql call when that function exists; otherwise printed for the SQL editor
     
     sql_commands = [
         """
@@ -90,7 +129,6 @@ def create_tables(supabase: Client):
             id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
             user_id UUID REFERENCES users(id) ON DELETE CASCADE,
             clinic_id UUID REFERENCES clinics(id) ON DELETE CASCADE,
-            session_data JSONB DEFAULT '[]',
             last_message_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
@@ -105,6 +143,7 @@ def create_tables(supabase: Client):
             clinic_id UUID REFERENCES clinics(id) ON DELETE CASCADE,
             role VARCHAR(50) NOT NULL, -- 'user', 'assistant', 'tool'
             content TEXT,
+            content_json JSONB, -- structured content (tool results), used when content is NULL
             tool_calls JSONB,
             tool_call_id VARCHAR(255),
             function_name VARCHAR(255),
@@ -133,14 +172,267 @@ def create_tables(supabase: Client):
         """,
         
         """
-        -- Indexes for better performance
-        CREATE INDEX IF NOT EXISTS idx_users_phone_clinic ON users(phone_number, clinic_id);
-        CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages(session_id);
-        CREATE INDEX IF NOT EXISTS idx_appointments_user_clinic ON appointments(user_id, clinic_id);
-        CREATE INDEX IF NOT EXISTS idx_appointments_datetime ON appointments(appointment_datetime);
+        -- Columns added after the initial release (no-ops on fresh installs)
+        ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS content_json JSONB;
+        """,
+        
+        """
+        -- chat_sessions.session_data (a JSONB message array rewritten whole on every update) is
+        -- replaced by one chat_messages row per message. Copy array-only histories over, in order,
+        -- for sessions that have no chat_messages rows, then drop the column.
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'chat_sessions' AND column_name = 'session_data'
+            ) THEN
+                INSERT INTO chat_messages (session_id, user_id, clinic_id, role, content, content_json,
+                                           tool_calls, tool_call_id, function_name, created_at)
+                SELECT
+                    s.id,
+                    s.user_id,
+                    s.clinic_id,
+                    m.msg->>'role',
+                    CASE WHEN jsonb_typeof(m.msg->'content') = 'string' THEN m.msg->>'content' END,
+                    CASE WHEN jsonb_typeof(m.msg->'content') IN ('object', 'array') THEN m.msg->'content' END,
+                    m.msg->'tool_calls',
+                    m.msg->>'tool_call_id',
+                    m.msg->>'name',
+                    s.created_at + m.ord * INTERVAL '1 microsecond'
+                FROM chat_sessions s
+                CROSS JOIN LATERAL jsonb_array_elements(
+                    CASE WHEN jsonb_typeof(s.session_data) = 'array' THEN s.session_data ELSE '[]'::jsonb END
+                ) WITH ORDINALITY AS m(msg, ord)
+                WHERE m.msg->>'role' IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM chat_messages cm WHERE cm.session_id = s.id);
+
+                ALTER TABLE chat_sessions DROP COLUMN session_data;
+            END IF;
+        END $$;
+        """,
+        
+        """
+        -- Keep updated_at current so cached clinic data / prompts are rebuilt after edits
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_clinics_updated_at ON clinics;
+        CREATE TRIGGER trg_clinics_updated_at BEFORE UPDATE ON clinics
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+        DROP TRIGGER IF EXISTS trg_doctors_updated_at ON doctors;
+        CREATE TRIGGER trg_doctors_updated_at BEFORE UPDATE ON doctors
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        """,
+        
+        """
+        -- Resolve (or create) the user and their latest chat session in one round-trip
+        CREATE OR REPLACE FUNCTION ensure_user_and_session(p_phone TEXT, p_clinic TEXT, p_name TEXT DEFAULT NULL)
+        RETURNS TABLE (user_id UUID, session_id UUID) AS $$
+        #variable_conflict use_column
+        DECLARE
+            v_clinic UUID;
+            v_user UUID;
+            v_session UUID;
+        BEGIN
+            SELECT id INTO v_clinic FROM clinics WHERE clinic_id = p_clinic;
+            IF v_clinic IS NULL THEN
+                RETURN;
+            END IF;
+
+            INSERT INTO users (phone_number, clinic_id, name, last_active)
+            VALUES (p_phone, v_clinic, p_name, CURRENT_TIMESTAMP)
+            ON CONFLICT (phone_number, clinic_id) DO UPDATE
+                SET last_active = EXCLUDED.last_active,
+                    name = COALESCE(EXCLUDED.name, users.name)
+            RETURNING id INTO v_user;
+
+            SELECT id INTO v_session FROM chat_sessions
+            WHERE chat_sessions.user_id = v_user AND chat_sessions.clinic_id = v_clinic
+            ORDER BY last_message_at DESC
+            LIMIT 1;
+
+            IF v_session IS NULL THEN
+                INSERT INTO chat_sessions (user_id, clinic_id)
+                VALUES (v_user, v_clinic)
+                RETURNING id INTO v_session;
+            END IF;
+
+            RETURN QUERY SELECT v_user, v_session;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        
+        """
+        -- Insert a chat message and bump its session's last_message_at in one round-trip
+        CREATE OR REPLACE FUNCTION save_message_and_touch_session(
+            p_session UUID,
+            p_user UUID,
+            p_clinic_code TEXT,
+            p_role TEXT,
+            p_content TEXT,
+            p_content_json JSONB DEFAULT NULL,
+            p_tool_calls JSONB DEFAULT NULL,
+            p_tool_call_id TEXT DEFAULT NULL,
+            p_fn_name TEXT DEFAULT NULL
+        )
+        RETURNS BOOLEAN AS $$
+        DECLARE
+            v_clinic UUID;
+        BEGIN
+            SELECT id INTO v_clinic FROM clinics WHERE clinic_id = p_clinic_code;
+            IF v_clinic IS NULL THEN
+                RETURN FALSE;
+            END IF;
+
+            INSERT INTO chat_messages (session_id, user_id, clinic_id, role, content, content_json,
+                                       tool_calls, tool_call_id, function_name)
+            VALUES (p_session, p_user, v_clinic, p_role, p_content, p_content_json,
+                    p_tool_calls, p_tool_call_id, p_fn_name);
+
+            UPDATE chat_sessions SET last_message_at = CURRENT_TIMESTAMP WHERE id = p_session;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        
+        """
+        -- Upsert a clinic and its doctors from one JSON payload in a single transaction
+        -- (used by --populate-data; doctors are matched on their unique (clinic_id, name))
+        CREATE OR REPLACE FUNCTION populate_clinic(payload JSONB)
+        RETURNS UUID AS $$
+        DECLARE
+            v_clinic UUID;
+        BEGIN
+            INSERT INTO clinics (clinic_id, clinic_name, phone, whatsapp_contact, address, timezone, config)
+            VALUES (
+                payload->>'clinic_id',
+                payload->>'clinic_name',
+                payload->>'phone',
+                payload->>'whatsapp_contact',
+                payload->>'address',
+                COALESCE(payload->>'timezone', 'Asia/Karachi'),
+                COALESCE(payload->'config', '{}'::jsonb)
+            )
+            ON CONFLICT (clinic_id) DO UPDATE
+                SET clinic_name = EXCLUDED.clinic_name,
+                    phone = EXCLUDED.phone,
+                    whatsapp_contact = EXCLUDED.whatsapp_contact,
+                    address = EXCLUDED.address,
+                    timezone = EXCLUDED.timezone,
+                    config = EXCLUDED.config
+            RETURNING id INTO v_clinic;
+
+            INSERT INTO doctors (clinic_id, name, speciality, calendar_email, timings, services)
+            SELECT v_clinic, d.name, d.speciality, d.calendar_email, d.timings, COALESCE(d.services, '{}'::jsonb)
+            FROM jsonb_to_recordset(COALESCE(payload->'doctors', '[]'::jsonb))
+                AS d(name TEXT, speciality TEXT, calendar_email TEXT, timings TEXT, services JSONB)
+            ON CONFLICT (clinic_id, name) DO UPDATE
+                SET speciality = EXCLUDED.speciality,
+                    calendar_email = EXCLUDED.calendar_email,
+                    timings = EXCLUDED.timings,
+                    services = EXCLUDED.services;
+
+            RETURN v_clinic;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        
+        """
+        -- Prebuilt clinic_data payload per clinic (same shape as SupabaseService.get_clinic_data),
+        -- so a cache miss reads one row instead of joining clinics and doctors
+        CREATE MATERIALIZED VIEW IF NOT EXISTS clinic_catalog_mv AS
+        SELECT
+            c.clinic_id,
+            c.id,
+            jsonb_build_object(
+                'clinic_id', c.clinic_id,
+                'clinic_name', c.clinic_name,
+                'whatsapp_contact', c.whatsapp_contact,
+                'phone', c.phone,
+                'address', c.address,
+                'timezone', c.timezone,
+                'config', COALESCE(c.config, '{}'::jsonb),
+                -- The clinic's version is the latest change to the clinic or any of its doctors
+                'updated_at', GREATEST(c.updated_at, MAX(d.updated_at)),
+                'Doctors', COALESCE(
+                    jsonb_agg(
+                        jsonb_build_object(
+                            'Name', d.name,
+                            'Speciality', d.speciality,
+                            'Calendar_email', d.calendar_email,
+                            'Timings', d.timings,
+                            'Services', COALESCE(d.services, '{}'::jsonb)
+                        ) ORDER BY d.created_at, d.id
+                    ) FILTER (WHERE d.id IS NOT NULL),
+                    '[]'::jsonb
+                )
+            ) AS payload
+        FROM clinics c
+        LEFT JOIN doctors d ON d.clinic_id = c.id
+        GROUP BY c.id;
+
+        -- Required by REFRESH ... CONCURRENTLY
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_clinic_catalog_mv_clinic_id ON clinic_catalog_mv(clinic_id);
+        GRANT SELECT ON clinic_catalog_mv TO anon, authenticated, service_role;
+
+        -- Rebuild after any clinic or doctor change (clinic edits are rare; readers aren't blocked)
+        CREATE OR REPLACE FUNCTION refresh_clinic_catalog() RETURNS TRIGGER AS $$
+        BEGIN
+            REFRESH MATERIALIZED VIEW CONCURRENTLY clinic_catalog_mv;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql SECURITY DEFINER;
+
+        DROP TRIGGER IF EXISTS trg_clinics_refresh_catalog ON clinics;
+        CREATE TRIGGER trg_clinics_refresh_catalog AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON clinics
+            FOR EACH STATEMENT EXECUTE FUNCTION refresh_clinic_catalog();
+
+        DROP TRIGGER IF EXISTS trg_doctors_refresh_catalog ON doctors;
+        CREATE TRIGGER trg_doctors_refresh_catalog AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doctors
+            FOR EACH STATEMENT EXECUTE FUNCTION refresh_clinic_catalog();
+        """,
+        
+        """
+        -- Indexes for better performance (clinics.clinic_id and users(phone_number, clinic_id)
+        -- are already indexed by their UNIQUE constraints)
+        -- Chat history: latest N messages of a session
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created ON chat_messages(session_id, created_at DESC);
+        -- Latest session of a user at a clinic
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_clinic_last ON chat_sessions(user_id, clinic_id, last_message_at DESC);
+        -- Doctors of a clinic (clinic data load) and doctor by calendar email (appointments)
+        CREATE INDEX IF NOT EXISTS idx_doctors_clinic_email ON doctors(clinic_id, calendar_email);
+        -- Doctor names are unique per clinic (upsert conflict target for --populate-data)
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_doctors_clinic_name ON doctors(clinic_id, name);
+        -- A user's appointments, newest first
+        CREATE INDEX IF NOT EXISTS idx_appointments_user_clinic_datetime ON appointments(user_id, clinic_id, appointment_datetime DESC);
+        -- A clinic's appointments in a date range (range scan within one clinic)
+        CREATE INDEX IF NOT EXISTS idx_appointments_clinic_datetime ON appointments(clinic_id, appointment_datetime);
+        """,
+        
+        """
+        -- Superseded by the composite indexes above
+        DROP INDEX IF EXISTS idx_chat_messages_session;
+        DROP INDEX IF EXISTS idx_appointments_user_clinic;
+        DROP INDEX IF EXISTS idx_appointments_datetime;
+        -- Duplicate of the users(phone_number, clinic_id) UNIQUE index
+        DROP INDEX IF EXISTS idx_users_phone_clinic;
         """
     ]
     
+    try:
+        # One request, one transaction: a failing command rolls back all of them
+        timed("exec_sql", supabase.rpc('exec_sql', {'sql': "\n".join(sql_commands)}).execute)
+        print("✅ Schema applied")
+        print("    Now run this script again with --populate-data flag")
+        return True
+    except Exception as e:
+        print(f"⚠️  Could not apply the schema through exec_sql: {e}")
+    
     print("📝 SQL commands to run in Supabase SQL editor:")
     print("=" * 60)
     for i, cmd in enumerate(sql_commands, 1):
@@ -150,107 +442,84 @@ def create_tables(supabase: Client):
     
     print("⚠️  Please run these SQL commands in your Supabase dashboard SQL editor first!")
     print("    Then run this script again with --populate-data flag")
+    print("    (or create exec_sql once so future runs apply the schema directly):")
+    print(EXEC_SQL_FUNCTION.strip())
     return False
 
-def populate_sample_data(supabase: Client):
-    """Populate tables with sample clinic data"""
-    
-    print("📊 Populating sample data...")
-    
-    # Sample clinic data matching your structure
-    sample_clinic_data = {
-        "clinic_id": "temp",
-        "clinic_name": "TEMP",
-        "phone": "042-35714448",
-        "whatsapp_contact": "03458589440",
-        "address": "Plot 367, J3, Johar Town, Lahore",
-        "timezone": "Asia/Karachi",
-        "config": {
-            "working_hours": {
-                "start": "09:00",
-                "end": "19:00"
+# Sample clinic data matching your structure (used when no fixture file is given)
+SAMPLE_CLINIC_DATA = {
+    "clinic_id": "temp",
+    "clinic_name": "TEMP",
+    "phone": "042-35714448",
+    "whatsapp_contact": "03458589440",
+    "address": "Plot 367, J3, Johar Town, Lahore",
+    "timezone": "Asia/Karachi",
+    "config": {
+        "working_hours": {
+            "start": "09:00",
+            "end": "19:00"
+        }
+    },
+    "doctors": [
+        {
+            "name": "Ahmed Khan",
+            "speciality": "General Dentist",
+            "calendar_email": "ahmed@dentalcare.com",
+            "timings": "Mon-Sat: 8AM-8PM, Sun: 10AM-6PM",
+            "services": {
+                "Cleaning": "30 min",
+                "Filling": "45 min",
+                "Root Canal": "90 min",
+                "Extraction": "30 min"
             }
         },
-        "doctors": [
-            {
-                "name": "Ahmed Khan",
-                "speciality": "General Dentist",
-                "calendar_email": "ahmed@dentalcare.com",
-                "timings": "Mon-Sat: 8AM-8PM, Sun: 10AM-6PM",
-                "services": {
-                    "Cleaning": "30 min",
-                    "Filling": "45 min",
-                    "Root Canal": "90 min",
-                    "Extraction": "30 min"
-                }
-            },
-            {
-                "name": "Sarah Ahmed",
-                "speciality": "Pediatric Dentist",
-                "calendar_email": "sarah@dentalcare.com",
-                "timings": "Mon-Fri: 9AM-5PM, Sat: 9AM-2PM, Sun: Closed",
-                "services": {
-                    "Kids Cleaning": "25 min",
-                    "Kids Checkup": "20 min",
-                    "Fluoride Treatment": "15 min"
-                }
+        {
+            "name": "Sarah Ahmed",
+            "speciality": "Pediatric Dentist",
+            "calendar_email": "sarah@dentalcare.com",
+            "timings": "Mon-Fri: 9AM-5PM, Sat: 9AM-2PM, Sun: Closed",
+            "services": {
+                "Kids Cleaning": "25 min",
+                "Kids Checkup": "20 min",
+                "Fluoride Treatment": "15 min"
             }
-        ]
-    }
+        }
+    ]
+}
+
+def populate_sample_data(supabase: Client, fixture_path: Optional[str] = None):
+    """Populate tables with sample clinic data, or a clinic loaded from a JSON fixture file"""
+    
+    print("📊 Populating sample data...")
     
     try:
-        # 1. Insert clinic
-        print(f"🏥 Inserting clinic: {sample_clinic_data['clinic_name']}")
-        
-        clinic_insert_data = {
-            "clinic_id": sample_clinic_data["clinic_id"],
-            "clinic_name": sample_clinic_data["clinic_name"],
-            "phone": sample_clinic_data["phone"],
-            "whatsapp_contact": sample_clinic_data["whatsapp_contact"],
-            "address": sample_clinic_data["address"],
-            "timezone": sample_clinic_data["timezone"],
-            "config": sample_clinic_data["config"]
-        }
-        
-        # Check if clinic already exists
-        existing_clinic = supabase.table('clinics').select('id').eq('clinic_id', sample_clinic_data['clinic_id']).execute()
-        
-        if existing_clinic.data:
-            print(f"   ✅ Clinic already exists, updating...")
-            clinic_response = supabase.table('clinics').update(clinic_insert_data).eq('clinic_id', sample_clinic_data['clinic_id']).execute()
-            clinic_uuid = existing_clinic.data[0]['id']
+        if fixture_path:
+            # orjson parses the file's bytes directly (no intermediate str for large fixtures)
+            print(f"📂 Loading clinic data from {fixture_path}")
+            sample_clinic_data = orjson.loads(Path(fixture_path).read_bytes())
         else:
-            print(f"   ✅ Creating new clinic...")
-            clinic_response = supabase.table('clinics').insert(clinic_insert_data).execute()
-            clinic_uuid = clinic_response.data[0]['id']
+            sample_clinic_data = SAMPLE_CLINIC_DATA
         
-        print(f"   📋 Clinic UUID: {clinic_uuid}")
+        # Clinic and doctors are upserted server-side in one transaction (see populate_clinic)
+        print(f"🏥 Inserting clinic {sample_clinic_data['clinic_name']} with {len(sample_clinic_data['doctors'])} doctors...")
         
-        # 2. Insert doctors
-        print(f"👨‍⚕️ Inserting {len(sample_clinic_data['doctors'])} doctors...")
+        # The whole payload goes in one call: splitting it would commit each slice
+        # separately and leave a partial import behind if a later call failed
+        payload = {'payload': sample_clinic_data}
+        # Request body size, to tell a bandwidth-bound import from a latency-bound one
+        bytes_sent = len(orjson.dumps(payload))
+        response = timed(
+            f"populate_clinic ({len(sample_clinic_data['doctors'])} doctors)",
+            supabase.rpc('populate_clinic', payload).execute
+        )
+        clinic_uuid = response.data
+        print(f"   📦 Sent {bytes_sent / 1024:.1f} KiB in 1 request")
+        print(f"   📋 Clinic UUID: {clinic_uuid}")
         
         for doctor_data in sample_clinic_data['doctors']:
-            doctor_insert_data = {
-                "clinic_id": clinic_uuid,
-                "name": doctor_data["name"],
-                "speciality": doctor_data["speciality"],
-                "calendar_email": doctor_data["calendar_email"],
-                "timings": doctor_data["timings"],
-                "services": doctor_data["services"]
-            }
-            
-            # Check if doctor already exists
-            existing_doctor = supabase.table('doctors').select('id').eq('clinic_id', clinic_uuid).eq('name', doctor_data['name']).execute()
-            
-            if existing_doctor.data:
-                print(f"   ✅ {doctor_data['name']} already exists, updating...")
-                doctor_response = supabase.table('doctors').update(doctor_insert_data).eq('id', existing_doctor.data[0]['id']).execute()
-            else:
-                print(f"   ✅ Creating {doctor_data['name']}...")
-                doctor_response = supabase.table('doctors').insert(doctor_insert_data).execute()
-            
             # List services for this doctor
             services_list = ', '.join(doctor_data['services'].keys())
+            print(f"   ✅ {doctor_data['name']}")
             print(f"      Services: {services_list}")
         
         print("\n🎉 Sample data populated successfully!")
@@ -268,32 +537,44 @@ def verify_data(supabase: Client):
     
     print("🔍 Verifying data...")
     
+    count_tables = (
+        ("Users", "users"),
+        ("Chat Sessions", "chat_sessions"),
+        ("Chat Messages", "chat_messages"),
+        ("Appointments", "appointments")
+    )
+    
+    def run_queries():
+        # The queries are independent, so they run concurrently on the shared client's pool
+        with ThreadPoolExecutor(max_workers=len(count_tables) + 1) as executor:
+            # Clinics, with their doctors embedded (one request for all of them)
+            clinics_future = executor.submit(
+                supabase.table('clinics').select('clinic_id, clinic_name, doctors(name, speciality, services)').execute
+            )
+            # Other tables (HEAD requests: only the row count comes back, in Content-Range)
+            count_futures = [
+                (label, executor.submit(supabase.table(table).select('id', count='exact', head=True).execute))
+                for label, table in count_tables
+            ]
+            return clinics_future.result(), [(label, future.result().count) for label, future in count_futures]
+    
     try:
-        # Check clinics
-        clinics = supabase.table('clinics').select('*').execute()
+        clinics, counts = timed("clinics and counts", run_queries)
+        
         print(f"   📊 Clinics: {len(clinics.data)}")
         
         for clinic in clinics.data:
             print(f"      - {clinic['clinic_name']} ({clinic['clinic_id']})")
             
-            # Check doctors for this clinic
-            doctors = supabase.table('doctors').select('*').eq('clinic_id', clinic['id']).execute()
-            print(f"        Doctors: {len(doctors.data)}")
+            doctors = clinic['doctors']
+            print(f"        Doctors: {len(doctors)}")
             
-            for doctor in doctors.data:
-                services_count = len(doctor.get('services', {}))
+            for doctor in doctors:
+                services_count = len(doctor.get('services') or ())
                 print(f"          - {doctor['name']} ({doctor['speciality']}) - {services_count} services")
         
-        # Check other tables
-        users = supabase.table('users').select('id').execute()
-        sessions = supabase.table('chat_sessions').select('id').execute()
-        messages = supabase.table('chat_messages').select('id').execute()
-        appointments = supabase.table('appointments').select('id').execute()
-        
-        print(f"   📊 Users: {len(users.data)}")
-        print(f"   📊 Chat Sessions: {len(sessions.data)}")
-        print(f"   📊 Chat Messages: {len(messages.data)}")
-        print(f"   📊 Appointments: {len(appointments.data)}")
+        for label, count in counts:
+            print(f"   📊 {label}: {count}")
         
         print("✅ Data verification complete!")
         
@@ -316,7 +597,8 @@ def main():
         
         if len(sys.argv) > 1 and sys.argv[1] == "--populate-data":
             # Populate data (assumes tables exist)
-            success = populate_sample_data(supabase)
+            fixture_path = sys.argv[2] if len(sys.argv) > 2 else None
+            success = populate_sample_data(supabase, fixture_path)
             if success:
                 verify_data(supabase)
         elif len(sys.argv) > 1 and sys.argv[1] == "--verify":
@@ -326,13 +608,16 @@ def main():
             # Show table creation commands
             create_tables(supabase)
             print("\n🔧 Usage:")
-            print("  python setup_supabase.py                 # Show SQL commands")
+            print("  python setup_supabase.py                 # Create tables (or show SQL commands)")
             print("  python setup_supabase.py --populate-data # Populate sample data")
+            print("  python setup_supabase.py --populate-data clinic.json # Populate a clinic from a JSON file")
             print("  python setup_supabase.py --verify        # Verify existing data")
         
     except Exception as e:
         print(f"❌ Setup failed: {e}")
         return False
+    finally:
+        close_supabase_client()
     
     return True
 